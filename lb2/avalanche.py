@@ -0,0 +1,159 @@
+﻿import argparse
+import hashlib
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+
+# Large-sample avalanche analysis (part2 looks at one string and counts hex characters).
+#
+# Inputs are generated in batches as a (batch, input_len) uint8 array, every row gets
+# one change - a single flipped bit ("bit") or a single replaced alphanumeric
+# character ("char") - and both versions are hashed. The digests are packed into
+# (batch, digest_size) arrays, XORed and unpacked to bits, which gives the bit-level
+# Hamming distance per sample and how often every output bit flipped.
+#
+# AvalancheStats only keeps a histogram of distances and per-bit flip counts, so the
+# memory used does not depend on the number of samples, and partial stats from
+# several processes are merged by adding them up.
+
+ALGORITHMS = ("sha256", "sha3_256", "blake2b", "blake2s")
+SYMBOLS = np.frombuffer(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", dtype=np.uint8)
+BATCH_SIZE = 65_536
+
+
+class AvalancheStats:
+    def __init__(self, digest_bits: int):
+        self.digest_bits = digest_bits
+        self.histogram = np.zeros(digest_bits + 1, dtype=np.int64)  # samples per distance
+        self.bit_flips = np.zeros(digest_bits, dtype=np.int64)      # samples where output bit i flipped
+
+    @property
+    def samples(self) -> int:
+        return int(self.histogram.sum())
+
+    def update(self, diff_bits):
+        # diff_bits: (batch, digest_bits) array of 0/1
+        self.histogram += np.bincount(diff_bits.sum(axis=1, dtype=np.int64), minlength=self.digest_bits + 1)
+        self.bit_flips += diff_bits.sum(axis=0, dtype=np.int64)
+
+    def merge(self, other):
+        self.histogram += other.histogram
+        self.bit_flips += other.bit_flips
+        return self
+
+    def summary(self) -> dict:
+        n = self.samples
+        distances = np.arange(self.digest_bits + 1)
+        mean = float((distances * self.histogram).sum() / n) if n else 0.0
+        var = float(((distances - mean) ** 2 * self.histogram).sum() / n) if n else 0.0
+        seen = np.nonzero(self.histogram)[0]
+        flip_rate = self.bit_flips / n if n else np.zeros(self.digest_bits)
+        return {
+            "samples": n,
+            "digest_bits": self.digest_bits,
+            "mean_bits": mean,
+            "std_bits": var ** 0.5,
+            "mean_ratio": mean / self.digest_bits,
+            "expected_std": (self.digest_bits / 4) ** 0.5,  # binomial(digest_bits, 1/2)
+            "min_bits": int(seen[0]) if len(seen) else 0,
+            "max_bits": int(seen[-1]) if len(seen) else 0,
+            "max_bit_bias": float(np.abs(flip_rate - 0.5).max()) if n else 0.0,
+            "histogram": self.histogram.tolist(),
+            "bit_flip_rate": flip_rate.tolist(),
+        }
+
+
+def make_batch(rng, batch_size, input_len, mode):
+    # -> (original, modified) uint8 arrays of shape (batch_size, input_len)
+    rows = np.arange(batch_size)
+    if mode == "bit":
+        original = rng.integers(0, 256, (batch_size, input_len), dtype=np.uint8)
+        modified = original.copy()
+        bit = rng.integers(0, input_len * 8, batch_size)
+        modified[rows, bit >> 3] ^= (1 << (bit & 7)).astype(np.uint8)
+    elif mode == "char":
+        symbols = rng.integers(0, len(SYMBOLS), (batch_size, input_len))
+        original = SYMBOLS[symbols]
+        pos = rng.integers(0, input_len, batch_size)
+        # shift by 1..len-1 so the new character always differs
+        replaced = (symbols[rows, pos] + rng.integers(1, len(SYMBOLS), batch_size)) % len(SYMBOLS)
+        modified = original.copy()
+        modified[rows, pos] = SYMBOLS[replaced]
+    else:
+        raise ValueError("mode must be 'bit' or 'char'")
+    return original, modified
+
+
+def hash_rows(algorithm, rows):
+    # hash every row of a uint8 array -> (rows, digest_size) uint8 array
+    new = getattr(hashlib, algorithm)
+    count, width = rows.shape
+    data = memoryview(np.ascontiguousarray(rows)).cast("B")
+    digests = b"".join([new(data[o:o + width]).digest() for o in range(0, count * width, width)])
+    return np.frombuffer(digests, dtype=np.uint8).reshape(count, -1)
+
+
+def digest_bits(algorithm) -> int:
+    return getattr(hashlib, algorithm)().digest_size * 8
+
+
+def run_batch(args) -> AvalancheStats:
+    algorithm, batch_size, input_len, mode, seed, batch_no = args
+    rng = np.random.default_rng([seed, batch_no])
+    original, modified = make_batch(rng, batch_size, input_len, mode)
+    diff = hash_rows(algorithm, original) ^ hash_rows(algorithm, modified)
+    stats = AvalancheStats(digest_bits(algorithm))
+    stats.update(np.unpackbits(diff, axis=1))
+    return stats
+
+
+def analyze(algorithm="sha256", samples=1_000_000, mode="bit", input_len=16, batch_size=BATCH_SIZE,
+            workers=1, seed=None) -> dict:
+    # Returns the AvalancheStats summary plus algorithm, mode, input_len, elapsed_sec, samples_per_sec.
+    # The same seed gives the same result for any number of workers.
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unsupported algorithm: {algorithm}")
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    workers = workers or os.cpu_count() or 1
+    batches = [(algorithm, min(batch_size, samples - start), input_len, mode, seed, batch_no)
+               for batch_no, start in enumerate(range(0, samples, batch_size))]
+
+    start = time.time()
+    stats = AvalancheStats(digest_bits(algorithm))
+    if workers == 1:
+        for batch in batches:
+            stats.merge(run_batch(batch))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for partial in pool.imap_unordered(run_batch, batches):
+                stats.merge(partial)
+    elapsed = time.time() - start
+
+    result = {"algorithm": algorithm, "mode": mode, "input_len": input_len}
+    result.update(stats.summary())
+    result["elapsed_sec"] = elapsed
+    result["samples_per_sec"] = samples / elapsed if elapsed > 0 else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Avalanche effect over many samples")
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--input-len", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="0 = all CPUs")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--algorithm", action="append", choices=ALGORITHMS)
+    args = parser.parse_args()
+
+    print(f"{'algorithm':<10} {'mode':<5} {'mean':>8} {'ratio':>7} {'std':>6} {'exp.std':>7} "
+          f"{'min':>4} {'max':>4} {'bit bias':>9} {'samples/s':>11}")
+    for algorithm in args.algorithm or ("sha256", "sha3_256", "blake2b"):
+        for mode in ("bit", "char"):
+            r = analyze(algorithm, args.samples, mode, args.input_len, workers=args.workers, seed=args.seed)
+            print(f"{algorithm:<10} {mode:<5} {r['mean_bits']:>8.3f} {r['mean_ratio']:>7.2%} "
+                  f"{r['std_bits']:>6.3f} {r['expected_std']:>7.3f} {r['min_bits']:>4} {r['max_bits']:>4} "
+                  f"{r['max_bit_bias']:>9.5f} {r['samples_per_sec']:>11,.0f}")
@@ -0,0 +1,187 @@
+﻿import heapq
+import json
+import os
+import time
+
+
+# Account balances kept up to date block by block instead of replaying the chain.
+#
+# Every applied block leaves an undo record (block hash, {account: delta}), so the
+# last blocks can be rolled back in O(block size) when they are replaced, e.g. after
+# the tamper / re-mine flow of part6. sync(chain) does all of it: finds where the
+# chain differs from what was applied, rolls back to there and applies the rest.
+#
+# Snapshots are compact JSON {"height", "tip_hash", "balances"} written to a temp
+# file and renamed over the old one, so a crash never leaves half a snapshot.
+# After a restart load() + sync(chain) only replays the blocks after the snapshot.
+# Accounts with balance 0 are not stored.
+
+MAX_UNDO = 1000  # blocks that can be rolled back without a full rebuild
+
+
+class BalanceIndex:
+    def __init__(self, snapshot_path=None, snapshot_every=1000, max_undo=MAX_UNDO):
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.max_undo = max_undo
+        self.reset()
+
+    def reset(self):
+        self._balances = {}
+        self._undo = []          # (block hash, deltas) of the last applied blocks
+        self.height = 0          # number of applied blocks
+        self._base_hash = None   # hash of the block just below the undo window
+
+    @property
+    def tip_hash(self):
+        return self._undo[-1][0] if self._undo else self._base_hash
+
+    # queries
+
+    def get(self, account):
+        return self._balances.get(account, 0)
+
+    def balances(self, accounts) -> dict:
+        get = self._balances.get
+        return {account: get(account, 0) for account in accounts}
+
+    def top(self, n):
+        # n richest accounts as (account, balance)
+        return heapq.nlargest(n, self._balances.items(), key=lambda item: item[1])
+
+    def __len__(self):
+        return len(self._balances)
+
+    def __contains__(self, account):
+        return account in self._balances
+
+    # updates
+
+    def _add(self, deltas, sign):
+        balances = self._balances
+        for account, delta in deltas.items():
+            value = balances.get(account, 0) + sign * delta
+            if value:
+                balances[account] = value
+            else:
+                balances.pop(account, None)
+
+    def apply_block(self, block):
+        if self.height and block.prev_hash != self.tip_hash:
+            raise ValueError(f"block {block.index} does not extend the indexed tip")
+        deltas = {}
+        for tx in block.transactions:
+            amount = tx["amount"]
+            deltas[tx["from"]] = deltas.get(tx["from"], 0) - amount
+            deltas[tx["to"]] = deltas.get(tx["to"], 0) + amount
+        self._add(deltas, 1)
+        self._undo.append((block.hash, deltas))
+        self.height += 1
+
+        if len(self._undo) > 2 * self.max_undo:
+            # trim in bulk, the oldest half of the window
+            self._base_hash = self._undo[-self.max_undo - 1][0]
+            del self._undo[:-self.max_undo]
+        if self.snapshot_path and self.height % self.snapshot_every == 0:
+            self.save_snapshot()
+
+    def rollback(self, count=1):
+        if count > len(self._undo):
+            raise ValueError(f"can roll back at most {len(self._undo)} blocks")
+        for _ in range(count):
+            _, deltas = self._undo.pop()
+            self._add(deltas, -1)
+            self.height -= 1
+
+    def sync(self, chain) -> dict:
+        # Bring the index to the state after chain[-1]; chain: list of blocks or a BlockStore.
+        # Returns {"rolled_back", "applied", "rebuilt"}
+        base = self.height - len(self._undo)
+        fork = min(self.height, len(chain))
+        while fork > base and chain[fork - 1].hash != self._undo[fork - 1 - base][0]:
+            fork -= 1
+
+        rebuilt = False
+        if fork < base or (fork == base and base and chain[base - 1].hash != self._base_hash):
+            # chain differs below the undo window (or the snapshot) -> start over
+            self.reset()
+            fork, rebuilt = 0, True
+        rolled_back = self.height - fork
+        self.rollback(rolled_back)
+        for i in range(fork, len(chain)):
+            self.apply_block(chain[i])
+        return {"rolled_back": rolled_back, "applied": len(chain) - fork, "rebuilt": rebuilt}
+
+    # snapshots
+
+    def save_snapshot(self, path=None):
+        path = path or self.snapshot_path
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"height": self.height, "tip_hash": self.tip_hash, "balances": self._balances},
+                      f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, snapshot_path, snapshot_every=1000, max_undo=MAX_UNDO):
+        # index at the state of the snapshot (empty if there is none yet)
+        index = cls(snapshot_path, snapshot_every, max_undo)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path) as f:
+                data = json.load(f)
+            index._balances = data["balances"]
+            index.height = data["height"]
+            index._base_hash = data["tip_hash"]
+        return index
+
+
+def replay_balances(chain) -> dict:
+    # reference: balances from scratch
+    balances = {}
+    for block in chain:
+        for tx in block.transactions:
+            balances[tx["from"]] = balances.get(tx["from"], 0) - tx["amount"]
+            balances[tx["to"]] = balances.get(tx["to"], 0) + tx["amount"]
+    return {account: value for account, value in balances.items() if value}
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    from part6 import Block, create_genesis_block
+
+    rng = random.Random(1)
+    users = [f"user{i}" for i in range(1000)]
+
+    def random_txs(count):
+        return [{"from": rng.choice(users), "to": rng.choice(users), "amount": rng.randint(1, 100)}
+                for _ in range(count)]
+
+    chain = [create_genesis_block()]
+    for i in range(1, 500):
+        chain.append(Block(i, random_txs(200), chain[-1].hash))
+
+    path = os.path.join(tempfile.mkdtemp(), "balances.json")
+    index = BalanceIndex(path, snapshot_every=100)
+    start = time.time()
+    print("Initial sync:", index.sync(chain), f"{time.time() - start:.3f} s")
+    print("Matches full replay:", index.balances(users) == {u: replay_balances(chain).get(u, 0) for u in users})
+
+    # tamper with block 450 and rebuild the blocks after it (the part6 fix flow)
+    chain[450].update_tx(0, {"from": "user1", "to": "user2", "amount": 10_000})
+    for i in range(451, len(chain)):
+        chain[i] = Block(i, chain[i].transactions, chain[i - 1].hash)
+    start = time.time()
+    print("Sync after replacing blocks 450..:", index.sync(chain), f"{time.time() - start:.3f} s")
+    print("Matches full replay:", index.balances(users) == {u: replay_balances(chain).get(u, 0) for u in users})
+
+    # restart: snapshot at height 500 (saved by sync), two new blocks since
+    for i in range(500, 502):
+        chain.append(Block(i, random_txs(200), chain[-1].hash))
+    restarted = BalanceIndex.load(path, snapshot_every=100)
+    print(f"Loaded snapshot at height {restarted.height}, sync:", restarted.sync(chain))
+    print("Matches full replay:", restarted.balances(users) == {u: replay_balances(chain).get(u, 0) for u in users})
+    print("Top 3:", restarted.top(3))
@@ -0,0 +1,203 @@
+﻿import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from part3 import find_prefix_collision
+from part5 import sign_document, verify_document
+from part6 import Block, build_merkle_tree, create_genesis_block, validate_chain
+from part7 import getMerkleProof, hash_tx, verifyProof
+from sig_schemes import SCHEMES
+
+
+# Benchmarks of the hot paths. Every case is run `repeat` times and the best time is kept.
+#
+#   python benchmark.py                          quick sizes, results printed
+#   python benchmark.py --profile full -o r.json all sizes (up to 1M txs), JSON written
+#   python benchmark.py --baseline base.json     compare with a stored run, exit code 1
+#                                                if any case is slower than threshold allows
+#   python benchmark.py --save-baseline base.json
+
+PROFILES = {
+    "quick": {
+        "payload_sizes": [64, 1024, 1 << 20],
+        "tx_counts": [1, 100, 10_000],
+        "doc_sizes": [1024, 1 << 20],
+        "chain_blocks": [(50, 100)],  # (blocks, txs per block)
+        "collision_n": [3, 4],
+        "scheme_ops": (5, 100),  # (keygens, signs/verifies) per scheme
+    },
+    "full": {
+        "payload_sizes": [64, 1024, 1 << 20, 64 << 20],
+        "tx_counts": [1, 100, 10_000, 100_000, 1_000_000],
+        "doc_sizes": [1024, 1 << 20, 64 << 20],
+        "chain_blocks": [(50, 100), (500, 1000)],
+        "collision_n": [3, 4, 5, 6],
+        "scheme_ops": (20, 1000),
+    },
+}
+
+PROOF_SAMPLE = 1000  # proofs per block size
+
+
+def measure(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def make_txs(count):
+    return [{"from": f"user{i % 97}", "to": f"user{(i * 7) % 101}", "amount": i % 1000} for i in range(count)]
+
+
+def bench_hashing(profile, repeat):
+    for size in profile["payload_sizes"]:
+        data = os.urandom(size)
+        for name in ("sha256", "sha3_256"):
+            fn = getattr(hashlib, name)
+            yield f"hash.{name}.{size}B", measure(lambda: fn(data).hexdigest(), repeat), size
+
+
+def bench_merkle(profile, repeat):
+    for count in profile["tx_counts"]:
+        txs = make_txs(count)
+        yield f"merkle.build.{count}tx", measure(lambda: build_merkle_tree(txs), repeat), count
+
+        levels = build_merkle_tree(txs)
+        root = levels[-1][0]
+        sample = [hash_tx(tx) for tx in random.Random(count).sample(txs, min(count, PROOF_SAMPLE))]
+        yield (f"merkle.proof.{count}tx",
+               measure(lambda: [getMerkleProof(t, levels) for t in sample], repeat), len(sample))
+        proofs = [(t, getMerkleProof(t, levels)) for t in sample]
+        yield (f"merkle.verify.{count}tx",
+               measure(lambda: [verifyProof(t, p, root) for t, p in proofs], repeat), len(sample))
+
+
+def bench_signatures(profile, repeat):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    for size in profile["doc_sizes"]:
+        doc = {"id": "DOC-BENCH", "content": "x" * size}
+        yield f"sign.document.{size}B", measure(lambda: sign_document(doc, key), repeat), 1
+        signature = sign_document(doc, key)
+        yield f"verify.document.{size}B", measure(lambda: verify_document(doc, signature, pem), repeat), 1
+
+
+def bench_schemes(profile, repeat):
+    keygens, ops = profile["scheme_ops"]
+    message = b"x" * 256
+    for name, scheme in SCHEMES.items():
+        yield (f"scheme.{name}.keygen",
+               measure(lambda: [scheme.generate_key() for _ in range(keygens)], repeat), keygens)
+        priv_key = scheme.generate_key()
+        pub_key = priv_key.public_key()
+        yield f"scheme.{name}.sign", measure(lambda: [scheme.sign_raw(priv_key, message) for _ in range(ops)], repeat), ops
+        raw = scheme.sign_raw(priv_key, message)
+        yield (f"scheme.{name}.verify",
+               measure(lambda: [scheme.verify(pub_key, raw, message) for _ in range(ops)], repeat), ops)
+
+
+def bench_chain(profile, repeat):
+    for blocks, per_block in profile["chain_blocks"]:
+        chain = [create_genesis_block()]
+        for i in range(1, blocks):
+            chain.append(Block(i, make_txs(per_block), chain[-1].hash))
+        yield (f"chain.validate.{blocks}x{per_block}",
+               measure(lambda: validate_chain(chain), repeat), blocks * per_block)
+
+
+def bench_collision(profile, repeat):
+    for n in profile["collision_n"]:
+        yield (f"collision.n{n}",
+               measure(lambda: find_prefix_collision(n=n, verbose_every=0), repeat), 1)
+
+
+GROUPS = {
+    "hashing": bench_hashing,
+    "merkle": bench_merkle,
+    "signatures": bench_signatures,
+    "schemes": bench_schemes,
+    "chain": bench_chain,
+    "collision": bench_collision,
+}
+
+
+def run(profile_name="quick", groups=None, repeat=3, verbose=True):
+    profile = PROFILES[profile_name]
+    results = {}
+    for group in groups or GROUPS:
+        for name, seconds, items in GROUPS[group](profile, repeat):
+            results[name] = {"seconds": seconds, "items": items,
+                             "items_per_sec": items / seconds if seconds > 0 else 0.0}
+            if verbose:
+                print(f"{name:<36} {seconds * 1000:>12.3f} ms  {results[name]['items_per_sec']:>14,.0f} items/s")
+    return {
+        "meta": {
+            "profile": profile_name,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "time": int(time.time()),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.10):
+    # -> list of regressions: (name, baseline seconds, current seconds, ratio)
+    regressions = []
+    for name, res in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or base["seconds"] <= 0:
+            continue
+        ratio = res["seconds"] / base["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append((name, base["seconds"], res["seconds"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of hashing, Merkle, proofs, signatures, "
+                                                 "chain validation and collision search")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--group", action="append", choices=sorted(GROUPS), help="run only these groups")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    parser.add_argument("--save-baseline", help="write results as the new baseline")
+    args = parser.parse_args(argv)
+
+    current = run(args.profile, args.group, args.repeat)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for name, base, cur, ratio in regressions:
+                print(f"  {name:<36} {base * 1000:.3f} ms -> {cur * 1000:.3f} ms  (x{ratio:.2f})")
+            return 1
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
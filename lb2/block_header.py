@@ -0,0 +1,81 @@
+﻿import hashlib
+import struct
+
+
+# Fixed-size binary block header (84 bytes, little-endian):
+#
+#   prev_hash    32 bytes  raw sha256 of the previous header
+#   merkle_root  32 bytes  raw root digest
+#   timestamp     8 bytes  unsigned, seconds
+#   difficulty    4 bytes  required leading zero bits (0 = not mined)
+#   nonce         8 bytes  unsigned, last so miners can keep the hash state of the rest
+#
+# The block hash is sha256 over these 84 bytes, no text formatting involved.
+# unpack_header works on any buffer (bytes, bytearray, memoryview, mmap) at an offset,
+# and HeaderArray keeps many headers back to back in one bytearray.
+
+HEADER = struct.Struct("<32s32sQIQ")
+HEADER_SIZE = HEADER.size
+NONCE_OFFSET = HEADER_SIZE - 8
+NONCE = struct.Struct("<Q")
+
+
+def pack_header(prev_hash: bytes, merkle_root: bytes, timestamp: int, difficulty: int = 0, nonce: int = 0) -> bytes:
+    return HEADER.pack(prev_hash, merkle_root, timestamp, difficulty, nonce)
+
+
+def pack_header_into(buf, offset, prev_hash, merkle_root, timestamp, difficulty=0, nonce=0):
+    HEADER.pack_into(buf, offset, prev_hash, merkle_root, timestamp, difficulty, nonce)
+
+
+def unpack_header(buf, offset=0):
+    # -> (prev_hash, merkle_root, timestamp, difficulty, nonce)
+    return HEADER.unpack_from(buf, offset)
+
+
+def header_hash(header) -> bytes:
+    return hashlib.sha256(header).digest()
+
+
+class HeaderArray:
+    # Many headers in one contiguous bytearray, indexed by position.
+    # Reads unpack/hash straight from the buffer; no views are kept alive,
+    # so the array can still grow.
+
+    def __init__(self, data=b""):
+        if len(data) % HEADER_SIZE:
+            raise ValueError("buffer size must be a multiple of the header size")
+        self._buf = bytearray(data)
+
+    def __len__(self):
+        return len(self._buf) // HEADER_SIZE
+
+    def append(self, header):
+        if len(header) != HEADER_SIZE:
+            raise ValueError("header must be exactly %d bytes" % HEADER_SIZE)
+        self._buf += header
+
+    def _offset(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("header position out of range")
+        return i * HEADER_SIZE
+
+    def __getitem__(self, i) -> bytes:
+        offset = self._offset(i)
+        return bytes(self._buf[offset:offset + HEADER_SIZE])
+
+    def unpack(self, i):
+        return unpack_header(self._buf, self._offset(i))
+
+    def hash(self, i) -> bytes:
+        offset = self._offset(i)
+        return header_hash(self._buf[offset:offset + HEADER_SIZE])
+
+    def drop_first(self, count):
+        # forget the oldest headers (bounded windows)
+        del self._buf[:count * HEADER_SIZE]
+
+    def tobytes(self) -> bytes:
+        return bytes(self._buf)
@@ -0,0 +1,164 @@
+﻿import json
+import mmap
+import os
+import struct
+
+from merkle_tree import MerkleTree
+from part6 import Block
+from transaction import Transaction
+
+
+# Append-only on-disk chain.
+#
+#   <path>.dat - block records, each one is the header (JSON) followed by the txs (JSON list)
+#   <path>.idx - one fixed-width record per block: data offset, header length, txs length
+#
+# Both files are memory-mapped for reading. Opening a store only maps the index,
+# headers are read without touching the transactions, and the transactions of a
+# block are parsed the first time they are needed (StoredBlock.transactions).
+# A record is written to the data file first and to the index second, so a crash
+# can only leave unindexed bytes at the end of the data file, which are ignored.
+
+INDEX_RECORD = struct.Struct("<QII")  # offset, header_len, txs_len
+
+HEADER_FIELDS = ("index", "timestamp", "prev_hash", "merkle_root", "hash", "difficulty", "nonce", "header_format")
+
+
+def _tx_to_json(tx):
+    return tx.to_dict() if isinstance(tx, Transaction) else tx
+
+
+class StoredBlock(Block):
+    # Block backed by a BlockStore record: header fields are loaded at once,
+    # transactions and the Merkle tree only on first use.
+    # Records written before header_format was stored are text-header blocks, so
+    # that is the default here (Block.__init__, which sets it for new blocks, is not called).
+    header_format = "text"
+
+    def __init__(self, store, position, header):
+        self._store = store
+        self._position = position
+        self._transactions = None
+        self._merkle_tree = None
+        for name in HEADER_FIELDS:
+            if name in header:  # older records lack some fields -> Block class defaults
+                setattr(self, name, header[name])
+
+    @property
+    def transactions(self):
+        if self._transactions is None:
+            self._transactions = self._store.transactions(self._position)
+        return self._transactions
+
+    @property
+    def merkle_tree(self):
+        if self._merkle_tree is None:
+            self._merkle_tree = MerkleTree.from_transactions(self.transactions, legacy=True)
+        return self._merkle_tree
+
+
+class BlockStore:
+    def __init__(self, path):
+        self.path = path
+        self._data = open(path + ".dat", "ab+")
+        self._index = open(path + ".idx", "ab+")
+        # drop a partially written index record, if any
+        index_size = os.fstat(self._index.fileno()).st_size
+        if index_size % INDEX_RECORD.size:
+            self._index.truncate(index_size - index_size % INDEX_RECORD.size)
+        self._count = os.fstat(self._index.fileno()).st_size // INDEX_RECORD.size
+        self._data_map = None
+        self._index_map = None
+
+    def close(self):
+        for m in (self._data_map, self._index_map):
+            if m is not None:
+                m.close()
+        self._data_map = self._index_map = None
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    # writing
+
+    def append(self, block, sync=False):
+        header = {name: getattr(block, name) for name in HEADER_FIELDS}
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        txs_bytes = json.dumps([_tx_to_json(tx) for tx in block.transactions],
+                               separators=(",", ":")).encode("utf-8")
+
+        self._data.seek(0, os.SEEK_END)
+        offset = self._data.tell()
+        self._data.write(header_bytes)
+        self._data.write(txs_bytes)
+        self._data.flush()
+        if sync:
+            os.fsync(self._data.fileno())
+
+        self._index.write(INDEX_RECORD.pack(offset, len(header_bytes), len(txs_bytes)))
+        self._index.flush()
+        if sync:
+            os.fsync(self._index.fileno())
+        self._count += 1
+
+    def extend(self, blocks, sync=False):
+        for block in blocks:
+            self.append(block)
+        if sync:
+            os.fsync(self._data.fileno())
+            os.fsync(self._index.fileno())
+
+    # reading
+
+    def _map(self, f, current, needed):
+        # (re)map a file when it grew past the current mapping
+        if current is not None and len(current) >= needed:
+            return current
+        if current is not None:
+            current.close()
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _record(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("block position out of range")
+        self._index_map = self._map(self._index, self._index_map, (i + 1) * INDEX_RECORD.size)
+        offset, header_len, txs_len = INDEX_RECORD.unpack_from(self._index_map, i * INDEX_RECORD.size)
+        self._data_map = self._map(self._data, self._data_map, offset + header_len + txs_len)
+        return offset, header_len, txs_len
+
+    def header(self, i) -> dict:
+        offset, header_len, _ = self._record(i)
+        return json.loads(self._data_map[offset:offset + header_len])
+
+    def transactions(self, i) -> list:
+        offset, header_len, txs_len = self._record(i)
+        start = offset + header_len
+        txs = json.loads(self._data_map[start:start + txs_len])
+        if all("from" in tx and "to" in tx and "amount" in tx for tx in txs):
+            return Transaction.from_dicts(txs)
+        return txs
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        return StoredBlock(self, i, self.header(i))
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def headers(self, start=0, stop=None):
+        for i in range(start, self._count if stop is None else stop):
+            yield self.header(i)
@@ -0,0 +1,205 @@
+﻿import multiprocessing
+import os
+
+from part6 import check_block, chain_error
+from transaction import Transaction
+
+
+# Validator that remembers what it already checked.
+#
+# After a successful validate() the validator keeps a checkpoint (validated tip) plus a
+# cheap stamp of every checked block. The next call only rechecks:
+#   - blocks appended after the tip,
+#   - blocks marked with mark_dirty(i),
+#   - blocks whose object, header fields (hash, prev_hash, merkle_root, timestamp)
+#     or tx list (object, length) changed,
+#   - blocks with a Transaction changed in place (a change drops its cached digest),
+# and the prev_hash link of the block after each of them.
+# A plain dict tx cannot report a change, so once its block is validated it is
+# replaced in block.transactions by an equal Transaction (same txId); later
+# block.transactions[k]["amount"] = ... goes through the Transaction and is seen.
+# Only an old reference to the dict itself is no longer watched (mark_dirty(i) or
+# validate(full=True) for that). Dicts that cannot be converted (no from/to/amount,
+# non-str keys) keep their block rechecked on every call.
+#
+# min_difficulty (as in part6.validate_chain) is checked on every block at each call,
+# it is only an attribute read.
+#
+# validate(full=True) rechecks everything: Merkle and header checks of the blocks are
+# independent and run in a process pool, prev_hash links are checked afterwards.
+
+PARALLEL_MIN_BLOCKS = 64
+
+_pool_chain = None  # chain shared with forked workers
+
+
+def _check_range(task):
+    start, stop, blocks = task
+    if blocks is None:
+        blocks = _pool_chain[start:stop]
+    for i, block in enumerate(blocks, start):
+        reason = check_block(block)
+        if reason is not None:
+            return i, reason
+    return None
+
+
+def _loaded_txs(block):
+    # tx list if it is in memory (StoredBlock loads it lazily into _transactions)
+    fields = vars(block)
+    return fields.get("transactions", fields.get("_transactions"))
+
+
+def _block_stamp(block):
+    txs = _loaded_txs(block)
+    return (id(block), block.hash, block.prev_hash, block.merkle_root, block.timestamp,
+            id(txs), -1 if txs is None else len(txs))
+
+
+def _txs_changed(block):
+    # True if a tx changed or cannot be watched (a dict that _track_txs left as it is)
+    txs = _loaded_txs(block)
+    return txs is not None and any(not isinstance(tx, Transaction) or not tx.hashed for tx in txs)
+
+
+def _trackable(tx):
+    return (isinstance(tx, dict) and "from" in tx and "to" in tx and "amount" in tx
+            and all(type(key) is str for key in tx))
+
+
+def _track_txs(block):
+    # dict txs -> Transaction, and every digest cached, so a later change is visible
+    txs = _loaded_txs(block)
+    for k, tx in enumerate(txs or ()):
+        if _trackable(tx):
+            tx = txs[k] = Transaction.from_dict(tx)
+        if isinstance(tx, Transaction):
+            tx.digest
+
+
+class ChainValidator:
+    def __init__(self, chain, workers=None, verifier=None, min_difficulty=0):
+        self.chain = chain
+        self.min_difficulty = min_difficulty  # default for validate()
+        self.workers = workers or os.cpu_count() or 1
+        self.verifier = verifier  # tx_signing.TxVerifier, signatures are checked in this process
+        self._stamps = []  # stamp per validated position, len = validated tip + 1
+        self._dirty = set()
+
+    @property
+    def validated_tip(self):
+        return len(self._stamps) - 1  # -1 = nothing validated yet
+
+    def mark_dirty(self, i):
+        self._dirty.add(i)
+
+    def reset(self):
+        self._stamps = []
+        self._dirty.clear()
+
+    def validate(self, full=False, min_difficulty=None) -> dict:
+        # Returns {"valid", "index", "block_index", "reason", "checked"}
+        chain = self.chain
+        if min_difficulty is None:
+            min_difficulty = self.min_difficulty
+        if full:
+            self.reset()
+
+        to_check = {i for i in self._dirty if i < len(chain)}
+        to_check.update(range(len(self._stamps), len(chain)))
+        for i, stamp in enumerate(self._stamps[:len(chain)]):
+            if _block_stamp(chain[i]) != stamp or _txs_changed(chain[i]):
+                to_check.add(i)
+        to_check.discard(0)  # genesis is not checked, same as is_chain_valid
+
+        content_errors = self._check_contents(sorted(to_check))
+
+        # prev_hash links of every rechecked block and of the block after it
+        links = sorted({j for i in to_check for j in (i, i + 1) if 0 < j < len(chain)})
+        failure = None
+        for i in links:
+            if chain[i].prev_hash != chain[i - 1].hash:
+                failure = chain_error(chain, i, "prev_hash mismatch")
+                break
+        if content_errors:
+            i = min(content_errors)
+            if failure is None or i < failure["index"]:  # same index: prev_hash is checked first
+                failure = chain_error(chain, i, content_errors[i])
+        if min_difficulty:
+            limit = len(chain) if failure is None else failure["index"] + 1
+            for i in range(1, limit):  # same index: difficulty is checked first
+                if (chain[i].difficulty or 0) < min_difficulty:
+                    failure = chain_error(chain, i, "difficulty too low")
+                    break
+
+        if failure is None:
+            for i in to_check:
+                _track_txs(chain[i])  # the pool workers hashed their own copies
+            self._stamps = [_block_stamp(block) for block in chain]
+            self._dirty.clear()
+            return {"valid": True, "index": None, "block_index": None, "reason": None, "checked": len(to_check)}
+
+        # keep the checkpoint only below the failing block
+        bad = failure["index"]
+        for i in to_check:
+            if i < bad:
+                _track_txs(chain[i])
+        self._stamps = [_block_stamp(block) for block in chain[:bad]]
+        self._dirty = {i for i in to_check if i > bad}
+        failure["checked"] = len(to_check)
+        return failure
+
+    def _check_contents(self, positions) -> dict:
+        # position -> reason for the blocks that fail their own checks
+        if len(positions) < PARALLEL_MIN_BLOCKS or self.workers == 1:
+            errors = {}
+            for i in positions:
+                reason = check_block(self.chain[i], self.verifier)
+                if reason is not None:
+                    errors[i] = reason
+                    break  # later blocks do not matter, the first failure is reported
+            return errors
+
+        global _pool_chain
+        use_fork = "fork" in multiprocessing.get_all_start_methods()
+        # contiguous runs of positions, split into ~4 pieces per worker
+        step = max(1, len(positions) // (4 * self.workers))
+        tasks = []
+        for k in range(0, len(positions), step):
+            for start, stop in _runs(positions[k:k + step]):
+                tasks.append((start, stop, None if use_fork else self.chain[start:stop]))
+
+        ctx = multiprocessing.get_context("fork" if use_fork else None)
+        _pool_chain = self.chain if use_fork else None
+        errors = {}
+        try:
+            with ctx.Pool(self.workers) as pool:
+                # imap keeps the order, so the first failure found is the lowest position
+                for result in pool.imap(_check_range, tasks):
+                    if result is not None:
+                        errors = {result[0]: result[1]}
+                        break
+        finally:
+            _pool_chain = None
+
+        if self.verifier is not None:
+            # the signature cache lives here, so signatures are not checked in the workers
+            first_error = min(errors, default=len(self.chain))
+            for i in positions:
+                if i >= first_error:
+                    break
+                reason = self.verifier.check_block(self.chain[i])
+                if reason is not None:
+                    return {i: reason}
+        return errors
+
+
+def _runs(positions):
+    # sorted positions -> list of (start, stop) ranges of consecutive positions
+    runs = []
+    for i in positions:
+        if runs and runs[-1][1] == i:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return [tuple(r) for r in runs]
@@ -0,0 +1,73 @@
+﻿import hashlib
+
+
+# Reusable engine for nonce loops: H(base + nonce) where base is fixed.
+# The base is absorbed once and every nonce only copies that hash state (midstate),
+# nonces are rendered into a preallocated buffer and the result stays a raw digest.
+# Hex is only needed for printing results (hexdigest / digest.hex()).
+#
+# By default the nonce is decimal text (f"{base}{nonce}"); with nonce_struct
+# (e.g. struct.Struct("<Q")) it is packed binary, as in the binary block header.
+
+class NonceHasher:
+    def __init__(self, base, algorithm="sha256", nonce_struct=None):
+        if isinstance(base, str):
+            base = base.encode("utf-8")
+        self.base = base
+        self.algorithm = algorithm
+        self.nonce_struct = nonce_struct
+        self._state = hashlib.new(algorithm, base)
+
+    def digest(self, nonce: int) -> bytes:
+        # decimal nonce: same bytes as f"{base}{nonce}".encode(), or packed with nonce_struct
+        h = self._state.copy()
+        h.update(self.nonce_struct.pack(nonce) if self.nonce_struct else b"%d" % nonce)
+        return h.digest()
+
+    def hexdigest(self, nonce: int) -> str:
+        return self.digest(nonce).hex()
+
+    def scan(self, start: int, stop: int, step: int = 1):
+        # Yield (nonce, digest) for nonces in range(start, stop, step).
+        # For step == 1 the decimal text of the nonce is incremented in place inside
+        # a bytearray, so no str/bytes object is built per nonce.
+        # A packed nonce is written into one preallocated buffer with pack_into.
+        if self.nonce_struct is not None:
+            state, pack_into = self._state, self.nonce_struct.pack_into
+            buf = bytearray(self.nonce_struct.size)
+            for nonce in range(start, stop, step):
+                pack_into(buf, 0, nonce)
+                h = state.copy()
+                h.update(buf)
+                yield nonce, h.digest()
+            return
+        if step != 1:
+            for nonce in range(start, stop, step):
+                yield nonce, self.digest(nonce)
+            return
+
+        state = self._state
+        buf = bytearray(b"%032d" % start)  # digits right-aligned, room for the carry
+        pos = len(buf) - len(b"%d" % start)
+        view = memoryview(buf)[pos:]
+        last = len(buf) - 1
+        for nonce in range(start, stop):
+            h = state.copy()
+            h.update(view)
+            yield nonce, h.digest()
+
+            # nonce + 1 in decimal text
+            i = last
+            while buf[i] == 57:  # "9"
+                buf[i] = 48      # "0"
+                i -= 1
+            buf[i] += 1
+            if i < pos:
+                pos = i
+                view = memoryview(buf)[pos:]
+
+
+def prefix_int(digest: bytes, n: int) -> int:
+    # First n hex symbols of the digest as an int, without building the hex string
+    value = int.from_bytes(digest[:(n + 1) // 2], "big")
+    return value >> 4 if n % 2 else value
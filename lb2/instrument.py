@@ -0,0 +1,292 @@
+﻿import contextlib
+import cProfile
+import functools
+import importlib
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+
+
+# Counters, timers and log2 histograms for the hot paths, switched on at runtime.
+#
+# enable() replaces the functions listed in HOOKS (module attributes, class
+# methods and properties) with timing wrappers, disable() puts the originals back.
+# Names bound elsewhere with "from part6 import check_block" are found in every
+# loaded module and rebound too, so calls are measured whatever the import style.
+# While disabled nothing is wrapped, so the cost is zero. A module imported while
+# enabled binds the wrapper itself; it keeps it, but stops recording on disable().
+#
+#   instrument.enable()
+#   ... run ...
+#   print(instrument.format_text())       # or dump("stats.json")
+#
+# profile_block(block) runs cProfile around a single part6.check_block call.
+
+HOOKS = (
+    "part6.sha256",
+    "part6.hash_tx",
+    "part6.build_merkle_tree",
+    "part6.check_block",
+    "part6.validate_chain",
+    "merkle_tree.MerkleTree.from_transactions",
+    "merkle_tree.tx_digest",
+    "merkle_tree.hash_level",
+    "merkle_tree.hash_pair",
+    "block_header.header_hash",
+    "transaction.Transaction.digest",
+    "part7.sha256",
+    "part7.build_merkle_tree",
+    "part7.getMerkleProof",
+    "part7.getMerkleProofs",
+    "part7.getMultiProof",
+    "part7.verifyProof",
+    "part7.verify_proofs",
+    "part5.sign_document",
+    "part5.verify_document",
+    "part5.verify_document_stream",
+    "sig_schemes.verify",
+    "tx_signing.verify_tx_signature",
+)
+
+enabled = False
+_patched = []   # (owner, attribute, original) to restore
+_timers = {}
+_counters = {}
+_lock = threading.Lock()
+
+
+class Timer:
+    # call count, total/min/max and a histogram of durations in power-of-two microsecond buckets
+
+    __slots__ = ("count", "total", "min", "max", "buckets", "_lock")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = {}  # k -> calls that took < 2**k microseconds (and >= 2**(k-1))
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        bucket = int(seconds * 1e6).bit_length()
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_sec": self.total,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "min_us": (self.min or 0.0) * 1e6,
+            "max_us": self.max * 1e6,
+            "histogram_us": {f"<{1 << k}": n for k, n in sorted(self.buckets.items())},
+        }
+
+
+def timer(name) -> Timer:
+    stat = _timers.get(name)
+    if stat is None:
+        with _lock:
+            stat = _timers.setdefault(name, Timer())
+    return stat
+
+
+def count(name, n=1):
+    # ad-hoc counter; a no-op while disabled
+    if enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+@contextlib.contextmanager
+def timed(name):
+    # time a block of code under `name` (only while enabled)
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer(name).add(time.perf_counter() - start)
+
+
+def _wrap(name, fn):
+    stat = timer(name)
+    perf_counter = time.perf_counter
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return fn(*args, **kwargs)
+        start = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stat.add(perf_counter() - start)
+
+    wrapper.__wrapped__ = fn
+    return wrapper
+
+
+def _resolve(hook):
+    # "module.func" or "module.Class.method" -> (owner, attribute)
+    module_name, _, rest = hook.partition(".")
+    owner = importlib.import_module(module_name)
+    *path, attribute = rest.split(".")
+    for part in path:
+        owner = getattr(owner, part)
+    return owner, attribute
+
+
+def _bindings(originals):
+    # id(function) -> [(module, name)] of every loaded module global bound to one of them
+    found = {}
+    for module in list(sys.modules.values()):
+        for name, value in list(getattr(module, "__dict__", {}).items()):
+            if id(value) in originals and value is originals[id(value)]:
+                found.setdefault(id(value), []).append((module, name))
+    return found
+
+
+def enable(hooks=HOOKS):
+    # on any error the hooks applied so far are removed again
+    global enabled
+    if enabled:
+        return
+    try:
+        targets = []
+        for hook in hooks:
+            owner, attribute = _resolve(hook)
+            original = vars(owner)[attribute] if isinstance(owner, type) else getattr(owner, attribute)
+            targets.append((hook, owner, attribute, original))
+        bindings = _bindings({id(t[3]): t[3] for t in targets if not isinstance(t[1], type)})
+        for hook, owner, attribute, original in targets:
+            if isinstance(original, (classmethod, staticmethod)):
+                wrapped = type(original)(_wrap(hook, original.__func__))
+            elif isinstance(original, property):
+                wrapped = property(_wrap(hook, original.fget), original.fset, original.fdel, original.__doc__)
+            else:
+                wrapped = _wrap(hook, original)
+            places = [(owner, attribute)] if isinstance(owner, type) else bindings.get(id(original), [])
+            for place, name in places:
+                _patched.append((place, name, original))
+                setattr(place, name, wrapped)
+    except BaseException:
+        disable()
+        raise
+    enabled = True
+
+
+def disable():
+    global enabled
+    while _patched:
+        owner, attribute, original = _patched.pop()
+        setattr(owner, attribute, original)
+    enabled = False
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+@contextlib.contextmanager
+def active(hooks=HOOKS):
+    # instrumentation on for the duration of a with block
+    enable(hooks)
+    try:
+        yield
+    finally:
+        disable()
+
+
+def snapshot() -> dict:
+    return {
+        "enabled": enabled,
+        "time": time.time(),
+        "counters": dict(_counters),
+        "timers": {name: stat.summary() for name, stat in sorted(_timers.items()) if stat.count},
+    }
+
+
+def format_text(snap=None) -> str:
+    snap = snap or snapshot()
+    lines = [f"{'timer':<42} {'calls':>9} {'total ms':>10} {'mean us':>10} {'max us':>10}"]
+    for name, t in snap["timers"].items():
+        lines.append(f"{name:<42} {t['count']:>9,} {t['total_sec'] * 1000:>10.2f} "
+                     f"{t['mean_us']:>10.1f} {t['max_us']:>10.1f}")
+        lines.append("    " + "  ".join(f"{bucket}us:{n}" for bucket, n in t["histogram_us"].items()))
+    for name, n in sorted(snap["counters"].items()):
+        lines.append(f"{name:<42} {n:>9,}")
+    return "\n".join(lines)
+
+
+def dump(path=None, fmt="json"):
+    # write a snapshot (fmt "json" or "text"); without a path the text is returned
+    text = json.dumps(snapshot(), indent=2) if fmt == "json" else format_text()
+    if path is None:
+        return text
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def profile_call(fn, *args, sort="cumulative", limit=25, **kwargs):
+    # run fn under cProfile -> (result, pstats text)
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(limit)
+    return result, out.getvalue()
+
+
+def profile_block(block, verifier=None, sort="cumulative", limit=25):
+    # cProfile scoped to the validation of one block -> (reason or None, pstats text)
+    import part6
+    return profile_call(part6.check_block, block, verifier, sort=sort, limit=limit)
+
+
+if __name__ == "__main__":
+    import part6
+    import part7
+
+    txs = [{"from": f"user{i % 50}", "to": f"user{(i * 3) % 50}", "amount": i} for i in range(2000)]
+
+    def build_and_validate():
+        chain = [part6.create_genesis_block()]
+        for i in range(1, 20):
+            chain.append(part6.Block(i, txs[:100 * i], chain[-1].hash))
+        part6.is_chain_valid(chain)
+        return chain
+
+    build_and_validate()  # warm-up
+    for label in ("disabled", "enabled"):
+        if label == "enabled":
+            enable()
+        start = time.perf_counter()
+        chain = build_and_validate()
+        print(f"{label:<8} {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    levels = part7.build_merkle_tree(txs)
+    for tx in txs[:200]:
+        tx_id = part7.hash_tx(tx)
+        part7.verifyProof(tx_id, part7.getMerkleProof(tx_id, levels), levels[-1][0])
+    count("demo.proofs", 200)
+    disable()
+    print()
+    print(format_text())
+
+    reason, text = profile_block(chain[-1])
+    print(f"\ncProfile of one block validation (result: {reason}):")
+    print("\n".join(text.splitlines()[:20]))
@@ -0,0 +1,97 @@
+﻿from block_header import HEADER_SIZE, HeaderArray, header_hash, unpack_header
+from miner import target_from_bits
+from part7 import verifyProof
+
+
+# SPV-style light client: it only keeps block headers, never transactions.
+#
+# Headers (binary format from block_header.py) arrive as a stream; each one must point
+# to the hash of the previous one (and meet its PoW target, if it has one).
+# A header only proves the work of its own difficulty field, so min_difficulty
+# (as in part6.validate_chain) rejects headers that claim less, e.g. difficulty 0.
+# The last `retention` headers stay in one contiguous HeaderArray, older ones are
+# dropped except every `checkpoint_every`-th header, which is kept as a checkpoint.
+# Memory: retention * 84 bytes + 84 bytes per checkpoint.
+#
+# A tx is checked with verifyProof against the merkle root of any retained height.
+
+ZERO_HASH = b"\0" * 32
+
+
+class HeaderChainError(ValueError):
+    pass
+
+
+class LightClient:
+    def __init__(self, retention=2016, checkpoint_every=1000, start_height=0, start_prev_hash=ZERO_HASH,
+                 check_pow=True, min_difficulty=0):
+        # start_height / start_prev_hash: first expected header (genesis or a trusted checkpoint)
+        self.retention = retention
+        self.checkpoint_every = checkpoint_every
+        self.check_pow = check_pow
+        self.min_difficulty = min_difficulty
+        self.tip_hash = start_prev_hash  # raw hash of the last accepted header
+        self.height = start_height - 1    # height of the last accepted header
+        self._window = HeaderArray()
+        self._window_start = start_height  # height of self._window[0]
+        self._checkpoints = {}             # height -> header bytes
+
+    def add_header(self, header) -> int:
+        # Validate and store one header, returns its height
+        if len(header) != HEADER_SIZE:
+            raise HeaderChainError(f"header {self.height + 1}: wrong size {len(header)}")
+        prev_hash, _, _, difficulty, _ = unpack_header(header)
+        if prev_hash != self.tip_hash:
+            raise HeaderChainError(f"header {self.height + 1}: prev_hash mismatch")
+        if self.min_difficulty and difficulty < self.min_difficulty:
+            raise HeaderChainError(f"header {self.height + 1}: difficulty too low")
+        block_hash = header_hash(header)
+        if self.check_pow and difficulty and int.from_bytes(block_hash, "big") > target_from_bits(difficulty):
+            raise HeaderChainError(f"header {self.height + 1}: hash above target")
+
+        self.height += 1
+        self.tip_hash = block_hash
+        self._window.append(header)
+        if self.checkpoint_every and self.height % self.checkpoint_every == 0:
+            self._checkpoints[self.height] = bytes(header)
+        extra = len(self._window) - self.retention
+        if extra > 0:
+            self._window.drop_first(extra)
+            self._window_start += extra
+        return self.height
+
+    def add_headers(self, headers) -> int:
+        # headers: iterable of headers, or one buffer with headers back to back
+        # (bytes / bytearray / memoryview / mmap). Returns the new tip height.
+        if isinstance(headers, (bytes, bytearray, memoryview)) or hasattr(headers, "find"):
+            view = memoryview(headers)
+            if len(view) % HEADER_SIZE:
+                raise HeaderChainError("buffer size is not a multiple of the header size")
+            for offset in range(0, len(view), HEADER_SIZE):
+                self.add_header(view[offset:offset + HEADER_SIZE])
+        else:
+            for header in headers:
+                self.add_header(header)
+        return self.height
+
+    def header(self, height):
+        # Unpacked header (prev_hash, merkle_root, timestamp, difficulty, nonce) or None if not kept
+        if self._window_start <= height <= self.height:
+            return self._window.unpack(height - self._window_start)
+        if height in self._checkpoints:
+            return unpack_header(self._checkpoints[height])
+        return None
+
+    def merkle_root(self, height):
+        header = self.header(height)
+        return None if header is None else header[1].hex()
+
+    def verify_tx(self, height, txId: str, proof) -> bool:
+        root = self.merkle_root(height)
+        if root is None:
+            raise KeyError(f"header {height} is not retained")
+        return verifyProof(txId, proof, root)
+
+    def retained_heights(self):
+        return sorted(h for h in self._checkpoints if h < self._window_start) + \
+            list(range(self._window_start, self.height + 1))
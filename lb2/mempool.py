@@ -0,0 +1,183 @@
+﻿import heapq
+import json
+import time
+
+from part6 import Block, sha256
+from transaction import Transaction
+
+
+# Pool of pending transactions, keyed by txId (same value as part6.hash_tx).
+#
+#   _entries  txId -> (priority, seq, tx, size)   O(1) duplicate check / lookup
+#   _best     max-heap (-priority, seq, txId)     next txs for a block
+#   _worst    min-heap (priority, -seq, txId)     next tx to evict when the pool is full
+#
+# Removing a tx only deletes it from _entries; heap items whose txId is gone (or was
+# re-added with another seq) are skipped when they come to the top, and both heaps
+# are rebuilt when stale items outnumber live ones. Equal priorities are served
+# in arrival order and the newest of them is evicted first.
+# With a verifier (tx_signing.TxVerifier) only correctly signed txs are accepted;
+# the verifier's cache then lets block validation skip those signatures.
+
+def default_priority(tx):
+    return tx.get("fee", 0)
+
+
+def _tx_key(tx):
+    # -> (txId, size of the canonical JSON), one serialization per tx
+    if isinstance(tx, Transaction):
+        return tx.txid, len(tx.canonical())
+    tx_str = json.dumps(tx, sort_keys=True)
+    return sha256(tx_str), len(tx_str)
+
+
+class Mempool:
+    def __init__(self, max_txs=None, max_bytes=None, priority=default_priority, verifier=None):
+        self.max_txs = max_txs
+        self.max_bytes = max_bytes
+        self.priority = priority
+        self.verifier = verifier
+        self._entries = {}
+        self._best = []
+        self._worst = []
+        self._seq = 0
+        self._stale = 0
+        self.bytes = 0  # total canonical size of the pooled txs
+        self.stats = {"added": 0, "duplicates": 0, "evicted": 0, "rejected": 0, "invalid": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, tx_id):
+        return tx_id in self._entries
+
+    def get(self, tx_id):
+        entry = self._entries.get(tx_id)
+        return entry[2] if entry else None
+
+    def _full(self):
+        return ((self.max_txs is not None and len(self._entries) > self.max_txs)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes))
+
+    def add(self, tx, verified=False) -> bool:
+        # False if the tx is already pooled, badly signed (with a verifier)
+        # or has the lowest priority of a full pool
+        tx_id, size = _tx_key(tx)
+        if tx_id in self._entries:
+            self.stats["duplicates"] += 1
+            return False
+        if self.verifier is not None and not verified and not self.verifier.verify_tx(tx):
+            self.stats["invalid"] += 1
+            return False
+
+        priority = self.priority(tx)
+        seq = self._seq
+        self._seq += 1
+        self._entries[tx_id] = (priority, seq, tx, size)
+        self.bytes += size
+        heapq.heappush(self._best, (-priority, seq, tx_id))
+        heapq.heappush(self._worst, (priority, -seq, tx_id))
+
+        while self._full():
+            evicted, _ = self._pop(self._worst, -1)
+            if evicted == tx_id:
+                self.stats["rejected"] += 1
+                return False
+            self.stats["evicted"] += 1
+        self.stats["added"] += 1
+        return True
+
+    def add_many(self, txs) -> int:
+        if self.verifier is None:
+            return sum(self.add(tx) for tx in txs)
+        # signatures of the whole batch are checked in parallel first
+        txs = list(txs)
+        accepted = 0
+        for tx, valid in zip(txs, self.verifier.verify_txs(txs)):
+            if valid:
+                accepted += self.add(tx, verified=True)
+            else:
+                self.stats["invalid"] += 1
+        return accepted
+
+    def remove(self, tx_id):
+        # e.g. the tx was included in a block from another node; returns the tx or None
+        entry = self._entries.pop(tx_id, None)
+        if entry is None:
+            return None
+        self.bytes -= entry[3]
+        self._stale += 2  # one item in each heap
+        self._compact()
+        return entry[2]
+
+    def remove_block(self, block):
+        for tx in block.transactions:
+            self.remove(_tx_key(tx)[0])
+
+    def _pop(self, heap, seq_sign):
+        # pop the top live item of a heap and remove its tx from the pool -> (txId, tx) or None
+        entries = self._entries
+        while heap:
+            item = heapq.heappop(heap)
+            tx_id = item[2]
+            entry = entries.get(tx_id)
+            if entry is not None and entry[1] == seq_sign * item[1]:
+                del entries[tx_id]
+                self.bytes -= entry[3]
+                self._stale += 1  # its item in the other heap
+                self._compact()
+                return tx_id, entry[2]
+            self._stale -= 1
+        return None
+
+    def _compact(self):
+        if self._stale > 2 * len(self._entries) + 64:
+            self._best = [(-p, seq, tx_id) for tx_id, (p, seq, _, _) in self._entries.items()]
+            self._worst = [(p, -seq, tx_id) for tx_id, (p, seq, _, _) in self._entries.items()]
+            heapq.heapify(self._best)
+            heapq.heapify(self._worst)
+            self._stale = 0
+
+    def pop_best(self, count) -> list:
+        # up to count highest-priority txs, removed from the pool, O(count log n)
+        txs = []
+        while len(txs) < count:
+            popped = self._pop(self._best, 1)
+            if popped is None:
+                break
+            txs.append(popped[1])
+        return txs
+
+    def assemble_block(self, max_txs, prev_block, header_format="binary"):
+        # Next block on top of prev_block with the max_txs best txs (they leave the pool).
+        # If the block is dropped, add_many(block.transactions) puts them back.
+        txs = self.pop_best(max_txs)
+        return Block(prev_block.index + 1, txs, prev_block.hash, header_format)
+
+
+if __name__ == "__main__":
+    from part6 import create_genesis_block, is_chain_valid
+
+    pool = Mempool(max_txs=100_000)
+    txs = [{"from": f"user{i % 500}", "to": f"user{(i * 7) % 500}", "amount": i, "fee": (i * 7919) % 1000}
+           for i in range(150_000)]
+
+    start = time.time()
+    pool.add_many(txs)
+    elapsed = time.time() - start
+    print(f"Added {len(txs):,} txs in {elapsed:.3f} s ({len(txs) / elapsed:,.0f} tx/s)")
+    print(f"Pool: {len(pool):,} txs, {pool.bytes:,} bytes, stats {pool.stats}")
+
+    start = time.time()
+    accepted = pool.add_many(txs[:10_000])
+    print(f"Re-adding 10,000 txs accepted {accepted} in {time.time() - start:.3f} s")
+
+    chain = [create_genesis_block()]
+    for _ in range(3):
+        start = time.time()
+        block = pool.assemble_block(2_000, chain[-1])
+        chain.append(block)
+        fees = [tx["fee"] for tx in block.transactions]
+        print(f"Block {block.index}: {len(fees)} txs, fee {max(fees)}..{min(fees)}, "
+              f"assembled in {time.time() - start:.3f} s, pool {len(pool):,}")
+    print("Chain valid:", is_chain_valid(chain))
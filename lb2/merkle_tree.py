@@ -0,0 +1,203 @@
+﻿import hashlib
+import json
+import multiprocessing
+import os
+
+from transaction import Transaction
+
+DIGEST_SIZE = 32
+EMPTY_LEAF = hashlib.sha256(b"").digest()  # leaf of a block without transactions
+
+
+def tx_digest(tx) -> bytes:
+    # Raw 32-byte version of hash_tx(tx)
+    if isinstance(tx, Transaction):
+        return tx.digest
+    return hashlib.sha256(json.dumps(tx, sort_keys=True).encode("utf-8")).digest()
+
+
+def hash_pair(pair, legacy=False) -> bytes:
+    # pair: 64 bytes = left || right
+    if legacy:
+        return hashlib.sha256(pair.hex().encode("ascii")).digest()
+    return hashlib.sha256(pair).digest()
+
+
+def hash_level(level, legacy=False) -> bytearray:
+    # One level up: 32-byte nodes in, 32-byte parents out (last node duplicated if odd)
+    sha = hashlib.sha256
+    pair_size = 2 * DIGEST_SIZE
+    full = len(level) - len(level) % pair_size
+    if legacy:
+        parents = [sha(level[i:i + pair_size].hex().encode("ascii")).digest() for i in range(0, full, pair_size)]
+    else:
+        parents = [sha(level[i:i + pair_size]).digest() for i in range(0, full, pair_size)]
+    if full < len(level):
+        last = bytes(level[full:])
+        parents.append(hash_pair(last + last, legacy))
+    return bytearray(b"".join(parents))
+
+
+class MerkleTree:
+    # Merkle tree stored as raw digests: levels[i] is one bytearray holding
+    # 32 bytes per node (levels[0] = leaves, levels[-1] = root).
+    # Parents are H(left || right) over the raw 32-byte digests.
+    #
+    # legacy=True reproduces build_merkle_tree() from part6/part7, where the parent
+    # is sha256 of the concatenated hex strings; use it for blocks built with that code.
+    # If a level has an odd number of nodes the last one is duplicated (both modes).
+
+    def __init__(self, leaves, legacy=False):
+        # leaves: iterable of 32-byte digests or one flat bytes-like buffer
+        if isinstance(leaves, (bytes, bytearray, memoryview)):
+            level = bytearray(leaves)
+        else:
+            level = bytearray(b"".join(leaves))
+        if len(level) % DIGEST_SIZE:
+            raise ValueError("leaf buffer size must be a multiple of 32 bytes")
+        self.leaf_count = len(level) // DIGEST_SIZE
+        if not level:
+            level = bytearray(EMPTY_LEAF)
+
+        self.legacy = legacy
+        self.levels = [level]
+        while len(level) > DIGEST_SIZE:
+            level = self._hash_level(level)
+            self.levels.append(level)
+
+    @classmethod
+    def from_transactions(cls, txs, legacy=False, workers=1):
+        # workers != 1 -> build_parallel (None = one worker per CPU core)
+        if workers != 1:
+            return build_parallel(txs, legacy, workers)
+        return cls([tx_digest(tx) for tx in txs], legacy)
+
+    def _hash_pair(self, pair) -> bytes:
+        return hash_pair(pair, self.legacy)
+
+    def _hash_level(self, level) -> bytearray:
+        return hash_level(level, self.legacy)
+
+    # Incremental changes: only the nodes on the path from the changed leaf to the root
+    # are recomputed, O(log n) hashes. The result is identical to a full rebuild:
+    # a duplicated last node is always on the path of the last leaf.
+
+    def append(self, leaf: bytes):
+        if self.leaf_count == 0:
+            self.levels = [bytearray(leaf)]  # replaces the empty-block placeholder
+            self.leaf_count = 1
+            return
+        self.levels[0] += leaf
+        self.leaf_count += 1
+        self._update_path(self.leaf_count - 1)
+
+    def update(self, index: int, leaf: bytes):
+        if not 0 <= index < self.leaf_count:
+            raise IndexError("leaf index out of range")
+        offset = index * DIGEST_SIZE
+        self.levels[0][offset:offset + DIGEST_SIZE] = leaf
+        self._update_path(index)
+
+    def _update_path(self, index: int):
+        level = 0
+        while len(self.levels[level]) > DIGEST_SIZE:
+            index //= 2
+            pair = self.levels[level][index * 2 * DIGEST_SIZE:(index + 1) * 2 * DIGEST_SIZE]
+            if len(pair) == DIGEST_SIZE:
+                pair = pair * 2  # duplicate last if odd
+            parent = self._hash_pair(pair)
+
+            if level + 1 == len(self.levels):
+                self.levels.append(bytearray())
+            parents = self.levels[level + 1]
+            offset = index * DIGEST_SIZE
+            if offset == len(parents):
+                parents += parent
+            else:
+                parents[offset:offset + DIGEST_SIZE] = parent
+            level += 1
+
+    def __len__(self):
+        return self.leaf_count
+
+    def level_size(self, level: int) -> int:
+        return len(self.levels[level]) // DIGEST_SIZE
+
+    def node(self, level: int, index: int) -> bytes:
+        offset = index * DIGEST_SIZE
+        return bytes(self.levels[level][offset:offset + DIGEST_SIZE])
+
+    @property
+    def root(self) -> bytes:
+        return bytes(self.levels[-1][:DIGEST_SIZE])
+
+    def root_hex(self) -> str:
+        return self.levels[-1][:DIGEST_SIZE].hex()
+
+    def level_hex(self, level: int) -> list:
+        hex_level = self.levels[level].hex()
+        step = 2 * DIGEST_SIZE
+        return [hex_level[i:i + step] for i in range(0, len(hex_level), step)]
+
+    def levels_hex(self) -> list:
+        # Same layout as build_merkle_tree(): list of levels with hex strings
+        return [self.level_hex(i) for i in range(len(self.levels))]
+
+
+# Parallel construction for very large blocks: the leaves are split into subtrees of
+# 2^height leaves, every subtree (leaf hashing included) is built in a worker process
+# and the tree above the subtree roots is finished in the parent.
+# Subtrees start at multiples of 2^height, so their nodes are exactly the nodes of the
+# full tree; only the last (partial) subtree needs to keep duplicating its last node
+# up to the subtree height, which is what the full tree does there as well.
+
+PARALLEL_MIN_SUBTREE = 1 << 14
+
+_parallel_txs = None  # txs shared with forked workers (no pickling of transactions)
+
+
+def _build_subtree(task):
+    start, stop, height, legacy, txs = task
+    if txs is None:
+        txs = _parallel_txs[start:stop]
+    level = bytearray(b"".join([tx_digest(tx) for tx in txs]))
+    levels = [level]
+    for _ in range(height):
+        level = hash_level(level, legacy)
+        levels.append(level)
+    return levels
+
+
+def build_parallel(txs, legacy=False, workers=None, min_subtree=PARALLEL_MIN_SUBTREE) -> MerkleTree:
+    # Same levels and root as MerkleTree.from_transactions(txs, legacy), bit for bit
+    global _parallel_txs
+    workers = workers or os.cpu_count() or 1
+    count = len(txs)
+    if workers == 1 or count <= min_subtree:
+        return MerkleTree([tx_digest(tx) for tx in txs], legacy)
+
+    # about 4 subtrees per worker, each a power of two and not too small
+    target = max(min_subtree, -(-count // (4 * workers)))
+    height = (target - 1).bit_length()
+    size = 1 << height
+
+    use_fork = "fork" in multiprocessing.get_all_start_methods()
+    tasks = [(start, min(start + size, count), height, legacy, None if use_fork else txs[start:start + size])
+             for start in range(0, count, size)]
+    ctx = multiprocessing.get_context("fork" if use_fork else None)
+    _parallel_txs = txs if use_fork else None
+    try:
+        with ctx.Pool(workers) as pool:
+            subtrees = pool.map(_build_subtree, tasks)
+    finally:
+        _parallel_txs = None
+
+    tree = MerkleTree.__new__(MerkleTree)
+    tree.legacy = legacy
+    tree.leaf_count = count
+    tree.levels = [bytearray(b"".join(sub[i] for sub in subtrees)) for i in range(height + 1)]
+    level = tree.levels[-1]
+    while len(level) > DIGEST_SIZE:
+        level = hash_level(level, legacy)
+        tree.levels.append(level)
+    return tree
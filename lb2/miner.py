@@ -0,0 +1,110 @@
+﻿import multiprocessing
+import os
+import queue
+import struct
+import time
+
+from hash_engine import NonceHasher
+
+
+# Proof-of-work search: find a nonce so that sha256(prefix + nonce) <= target.
+# The prefix (everything in the header before the nonce) is hashed once, every
+# attempt only continues from that state (NonceHasher). With several workers the
+# nonce space is handed out in chunks from a shared counter; the search stops as
+# soon as one worker finds a nonce or the caller sets the cancel event
+# (e.g. a competing block arrived).
+# nonce_struct=None appends the nonce as decimal text (text headers),
+# a struct (block_header.NONCE) appends it packed (binary headers).
+# Workers are forked where possible; under spawn (macOS, Windows) their arguments
+# are pickled, so the struct travels as its format string and is rebuilt there.
+
+CHUNK_SIZE = 50_000
+CHECK_EVERY = 4_096  # nonces between checks of the stop flag
+
+
+def target_from_bits(difficulty_bits: int) -> int:
+    # hash (as a 256-bit number) must start with difficulty_bits zero bits
+    return (1 << (256 - difficulty_bits)) - 1
+
+
+def _scan(hasher, start, stop, target_bytes, stop_event):
+    # returns (nonce or None, attempts)
+    done = 0
+    for nonce, digest in hasher.scan(start, stop):
+        done += 1
+        if digest <= target_bytes:  # same length, so byte order == numeric order
+            return nonce, done
+        if done % CHECK_EVERY == 0 and stop_event.is_set():
+            break
+    return None, done
+
+
+def _worker(prefix, nonce_format, target_bytes, next_chunk, chunk_size, attempts, stop_event, results):
+    hasher = NonceHasher(prefix, nonce_struct=struct.Struct(nonce_format) if nonce_format else None)
+    while not stop_event.is_set():
+        with next_chunk.get_lock():
+            start = next_chunk.value
+            next_chunk.value += chunk_size
+        nonce, done = _scan(hasher, start, start + chunk_size, target_bytes, stop_event)
+        with attempts.get_lock():
+            attempts.value += done
+        if nonce is not None:
+            results.put(nonce)
+            return
+
+
+def mine_header(prefix, target: int, workers=1, cancel=None, start_nonce=0, chunk_size=CHUNK_SIZE,
+                nonce_struct=None):
+    # Returns {"nonce", "hash", "attempts", "elapsed_sec", "hashrate", "workers"}
+    # or None if cancelled. cancel: any object with is_set() (threading/multiprocessing Event).
+    workers = workers or os.cpu_count() or 1
+    target_bytes = target.to_bytes(32, "big")
+    hasher = NonceHasher(prefix, nonce_struct=nonce_struct)
+    start = time.time()
+
+    if workers == 1:
+        stop_event = cancel if cancel is not None else multiprocessing.Event()
+        nonce, attempts = None, 0
+        next_nonce = start_nonce
+        while nonce is None and not stop_event.is_set():
+            nonce, done = _scan(hasher, next_nonce, next_nonce + chunk_size, target_bytes, stop_event)
+            attempts += done
+            next_nonce += chunk_size
+    else:
+        ctx = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+        stop_event = ctx.Event()
+        next_chunk = ctx.Value("q", start_nonce)
+        shared_attempts = ctx.Value("q", 0)
+        results = ctx.Queue()
+        nonce_format = nonce_struct.format if nonce_struct is not None else None
+        procs = [ctx.Process(target=_worker, daemon=True,
+                             args=(prefix, nonce_format, target_bytes, next_chunk, chunk_size,
+                                   shared_attempts, stop_event, results))
+                 for _ in range(workers)]
+        for p in procs:
+            p.start()
+        nonce = None
+        try:
+            while nonce is None and not (cancel is not None and cancel.is_set()):
+                try:
+                    nonce = results.get(timeout=0.05)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in procs):
+                        break
+        finally:
+            stop_event.set()
+            for p in procs:
+                p.join()
+        attempts = shared_attempts.value
+
+    elapsed = time.time() - start
+    if nonce is None:
+        return None
+    return {
+        "nonce": nonce,
+        "hash": hasher.hexdigest(nonce),
+        "attempts": attempts,
+        "elapsed_sec": elapsed,
+        "hashrate": attempts / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+    }
@@ -0,0 +1,154 @@
+﻿import argparse
+import hashlib
+import io
+import mmap
+import os
+import queue
+import sys
+import threading
+import time
+
+
+# Fingerprint large files with several algorithms in one pass.
+#
+# The file is read once - through mmap, or with large read() calls for pipes and
+# when mmap is not possible - and every chunk is handed to all requested algorithms.
+# Each algorithm runs in its own thread with a small bounded queue of chunks:
+# hashlib releases the GIL while hashing large buffers, so the algorithms run in
+# parallel and memory stays at a few chunks whatever the file size.
+# Throughput is reported overall and per algorithm (bytes / time spent in update()).
+# The variable-length SHAKE algorithms have no digest size of their own; they are
+# printed with twice their security level in bits (XOF_DIGEST_SIZES).
+
+CHUNK_SIZE = 4 << 20
+QUEUE_DEPTH = 4  # chunks buffered per algorithm
+DEFAULT_ALGORITHMS = ("sha256", "sha3_256")
+XOF_DIGEST_SIZES = {"shake_128": 32, "shake_256": 64}  # bytes
+
+
+def _hexdigest(h):
+    # hexdigest() of a SHAKE object needs an output length
+    if h.digest_size == 0:
+        return h.hexdigest(XOF_DIGEST_SIZES.get(h.name, 32))
+    return h.hexdigest()
+
+
+def _mb_per_sec(size, seconds):
+    return size / seconds / 1e6 if seconds > 0 else 0.0
+
+
+def _try_mmap(f):
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError, AttributeError, io.UnsupportedOperation):
+        # empty file, pipe, or an object without a real file descriptor
+        return None
+
+
+def _read_chunks(f, chunk_size):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _hash_worker(name, h, chunks, busy):
+    spent = 0.0
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            break
+        start = time.perf_counter()
+        h.update(chunk)
+        spent += time.perf_counter() - start
+        del chunk  # let the mmap close once every thread is done with the view
+    busy[name] = spent
+
+
+def hash_chunks(chunks, algorithms=DEFAULT_ALGORITHMS, threads=True) -> dict:
+    # Hash an iterable of bytes-like chunks with every algorithm in one pass.
+    # Returns {"size", "elapsed_sec", "mb_per_sec",
+    #          "algorithms": {name: {"hexdigest", "busy_sec", "mb_per_sec"}}}
+    hashers = {name: hashlib.new(name) for name in algorithms}
+    busy = dict.fromkeys(hashers, 0.0)
+    size = 0
+    start = time.perf_counter()
+
+    if threads and len(hashers) > 1:
+        queues = {name: queue.Queue(QUEUE_DEPTH) for name in hashers}
+        workers = [threading.Thread(target=_hash_worker, args=(name, h, queues[name], busy), daemon=True)
+                   for name, h in hashers.items()]
+        for t in workers:
+            t.start()
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                for q in queues.values():
+                    q.put(chunk)
+            chunk = None
+        finally:
+            for q in queues.values():
+                q.put(None)
+            for t in workers:
+                t.join()
+    else:
+        for chunk in chunks:
+            size += len(chunk)
+            for name, h in hashers.items():
+                t0 = time.perf_counter()
+                h.update(chunk)
+                busy[name] += time.perf_counter() - t0
+        chunk = None
+
+    elapsed = time.perf_counter() - start
+    return {
+        "size": size,
+        "elapsed_sec": elapsed,
+        "mb_per_sec": _mb_per_sec(size, elapsed),
+        "algorithms": {
+            name: {
+                "hexdigest": _hexdigest(h),
+                "busy_sec": busy[name],
+                "mb_per_sec": _mb_per_sec(size, busy[name]),
+            }
+            for name, h in hashers.items()
+        },
+    }
+
+
+def hash_file(source, algorithms=DEFAULT_ALGORITHMS, chunk_size=CHUNK_SIZE, use_mmap=True, threads=True) -> dict:
+    # source: path, "-" for stdin, or a binary file object. Result as in hash_chunks.
+    if source == "-":
+        return hash_chunks(_read_chunks(sys.stdin.buffer, chunk_size), algorithms, threads)
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, "rb") as f:
+            return hash_file(f, algorithms, chunk_size, use_mmap, threads)
+    mm = _try_mmap(source) if use_mmap else None
+    if mm is None:
+        return hash_chunks(_read_chunks(source, chunk_size), algorithms, threads)
+    with mm:
+        # the chunk views must all be gone before the map is closed
+        view = memoryview(mm)
+        try:
+            return hash_chunks((view[offset:offset + chunk_size] for offset in range(0, len(mm), chunk_size)),
+                               algorithms, threads)
+        finally:
+            view.release()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hash files with several algorithms in a single pass")
+    parser.add_argument("files", nargs="+", help="files to hash, - for stdin")
+    parser.add_argument("-a", "--algorithm", action="append", choices=sorted(hashlib.algorithms_available),
+                        help=f"repeat for several (default: {', '.join(DEFAULT_ALGORITHMS)})")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE >> 20, help="MiB per read")
+    parser.add_argument("--no-mmap", action="store_true", help="use read() instead of mmap")
+    parser.add_argument("--no-threads", action="store_true", help="hash all algorithms in the reading thread")
+    args = parser.parse_args()
+
+    for path in args.files:
+        r = hash_file(path, args.algorithm or DEFAULT_ALGORITHMS, args.chunk_size << 20,
+                      use_mmap=not args.no_mmap, threads=not args.no_threads)
+        print(f"{path}: {r['size']:,} bytes in {r['elapsed_sec']:.3f} s ({r['mb_per_sec']:.1f} MB/s)")
+        for name, a in r["algorithms"].items():
+            print(f"  {name:<12} {a['hexdigest']}  {a['mb_per_sec']:>9.1f} MB/s")
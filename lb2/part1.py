@@ -1,12 +1,13 @@
 ﻿import hashlib
 
 text = input("Enter a string: ")
+data = text.encode()  # encoded once, used by both algorithms
 
 # SHA-256 calculation
-sha256_hash = hashlib.sha256(text.encode()).hexdigest()
+sha256_hash = hashlib.sha256(data).hexdigest()
 
 # SHA-3 (256) calculation
-sha3_256_hash = hashlib.sha3_256(text.encode()).hexdigest()
+sha3_256_hash = hashlib.sha3_256(data).hexdigest()
 
 # Results display
 print("\nResults:")
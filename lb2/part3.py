@@ -1,46 +1,281 @@
 ﻿import hashlib
+import math
+import os
 import time
+from array import array
+from multiprocessing import Pool
+
+from hash_engine import NonceHasher, prefix_int
 
 def sha256_hex(s: str) -> str:
     return hashlib.sha256(s.encode()).hexdigest()
 
-def find_prefix_collision(base="student_test", n=4, max_attempts=2_000_000, verbose_every=100_000):
+class CompactPrefixTable:
+    # Open-addressing table: prefix (as int) -> nonce, kept in two typed arrays
+    # (16 bytes per slot) instead of a dict of str -> tuple objects.
+    # Prefixes are hash bits, so the low bits of the key are already a good slot index.
+
+    def __init__(self, capacity=1 << 16):
+        size = 1 << max(4, (capacity - 1).bit_length())
+        self._mask = size - 1
+        self._keys = array("Q", bytes(8 * size))
+        self._vals = array("Q", bytes(8 * size))  # nonce + 1, 0 = empty slot
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def insert(self, key, nonce):
+        # Store key -> nonce; if the key is already present return its nonce instead (else -1)
+        keys, vals, mask = self._keys, self._vals, self._mask
+        i = key & mask
+        while vals[i]:
+            if keys[i] == key:
+                return vals[i] - 1
+            i = (i + 1) & mask
+        keys[i] = key
+        vals[i] = nonce + 1
+        self._count += 1
+        if self._count * 2 > mask:
+            self._grow()
+        return -1
+
+    def _grow(self):
+        old_keys, old_vals = self._keys, self._vals
+        self.__init__((self._mask + 1) * 2)
+        for key, val in zip(old_keys, old_vals):
+            if val:
+                self.insert(key, val - 1)
+
+    def insert_many(self, keys, nonces) -> list:
+        # Bulk insert of distinct keys with numpy, one probe step for all pending keys per round.
+        # Returns (nonce, stored nonce) for every key that was already present.
+        import numpy as np
+
+        if (self._count + len(keys)) * 2 > self._mask:
+            old_keys, old_vals = self._keys, self._vals
+            self.__init__((self._count + len(keys)) * 2)
+            used = np.frombuffer(old_vals, dtype=np.uint64) != 0
+            self.insert_many(np.frombuffer(old_keys, dtype=np.uint64)[used],
+                             np.frombuffer(old_vals, dtype=np.uint64)[used] - 1)
+        table_keys = np.frombuffer(self._keys, dtype=np.uint64)  # views: writes go into the arrays
+        table_vals = np.frombuffer(self._vals, dtype=np.uint64)
+        keys = np.asarray(keys, dtype=np.uint64)
+        vals = np.asarray(nonces, dtype=np.uint64) + 1
+        slots = keys & np.uint64(self._mask)
+        pending = np.arange(len(keys))
+        hits = []
+        while pending.size:
+            slot = slots[pending]
+            occupied = table_vals[slot] != 0
+            found = occupied & (table_keys[slot] == keys[pending])
+            hits.extend(zip((vals[pending[found]] - 1).tolist(), (table_vals[slot[found]] - 1).tolist()))
+            # keys that reached the same empty slot: the one whose write sticks takes it, the others probe on
+            empty = pending[~occupied]
+            table_keys[slots[empty]] = keys[empty]
+            won = table_keys[slots[empty]] == keys[empty]
+            table_vals[slots[empty[won]]] = vals[empty[won]]
+            self._count += int(won.sum())
+            moving = pending[occupied & ~found]
+            slots[moving] = (slots[moving] + np.uint64(1)) & np.uint64(self._mask)
+            pending = np.concatenate((moving, empty[~won]))
+        return hits
+
+
+def _collision_result(base, n, prev_nonce, nonce, attempts, elapsed, workers):
+    return {
+        "attempts": attempts,
+        "elapsed_sec": elapsed,
+        "attempts_per_sec": attempts / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+        "base": base,
+        "n": n,
+        "a": {"nonce": prev_nonce, "string": f"{base}{prev_nonce}", "hash": sha256_hex(f"{base}{prev_nonce}")},
+        "b": {"nonce": nonce, "string": f"{base}{nonce}", "hash": sha256_hex(f"{base}{nonce}")},
+    }
+
+def find_prefix_collision(base="student_test", n=4, max_attempts=2_000_000, verbose_every=100_000,
+                          workers=1, chunk_size=50_000, table="dict"):
+    # table="dict"    - dict of prefix (as int) -> nonce
+    # table="compact" - CompactPrefixTable with int prefixes (n <= 16), much less memory
     assert 1 <= n <= 64, "n must be within the range of 1..64 hex characters"
-    seen = {}  # prefix -> (nonce, full_hash)
+    assert table in ("dict", "compact"), "table must be 'dict' or 'compact'"
+    assert table == "dict" or n <= 16, "compact table supports n up to 16"
+    if workers is None or workers > 1:
+        return find_prefix_collision_parallel(base, n, max_attempts, verbose_every, workers, chunk_size, table)
+
+    hasher = NonceHasher(base)
+    seen = CompactPrefixTable() if table == "compact" else {}  # prefix (as int) -> nonce
+    insert = seen.insert if table == "compact" else None
     start = time.time()
 
-    for nonce in range(max_attempts):
-        s = f"{base}{nonce}"
-        h = sha256_hex(s)
-        prefix = h[:n]
-
-        if prefix in seen:
-            prev_nonce, prev_hash = seen[prefix]
-            if prev_nonce != nonce:
-                elapsed = time.time() - start
-                return {
-                    "attempts": nonce + 1,
-                    "elapsed_sec": elapsed,
-                    "base": base,
-                    "n": n,
-                    "a": {"nonce": prev_nonce, "string": f"{base}{prev_nonce}", "hash": prev_hash},
-                    "b": {"nonce": nonce, "string": s, "hash": h},
-                }
+    for nonce, digest in hasher.scan(0, max_attempts):
+        prefix = prefix_int(digest, n)  # first n hex symbols, read from the raw digest
+
+        if insert is not None:
+            prev_nonce = insert(prefix, nonce)
         else:
-            seen[prefix] = (nonce, h)
+            prev_nonce = seen.setdefault(prefix, nonce)
+        if prev_nonce != nonce and prev_nonce >= 0:
+            return _collision_result(base, n, prev_nonce, nonce, nonce + 1, time.time() - start, 1)
 
         if verbose_every and nonce % verbose_every == 0 and nonce > 0:
             print(f"[info] Verified {nonce:,} nonce... (unique prefixes: {len(seen):,})")
 
     return None  # not found within max_attempts
 
+
+# Parallel mode: the nonce space is cut into chunks, worker processes hash the chunks,
+# find collisions inside their own chunk and send back each distinct prefix once with
+# its first nonce. The parent merges whole chunks in nonce order with bulk operations
+# (dict views / CompactPrefixTable.insert_many), so the result stays identical to the
+# single-core search without a Python step per nonce in the parent.
+
+def _hash_chunk(task):
+    # -> (distinct prefixes, their first nonces, first collision inside the chunk or None);
+    # after an in-chunk collision the rest of the chunk cannot give an earlier one and is skipped
+    base, n, chunk_start, chunk_stop = task
+    first = {}
+    pair = None
+    for nonce, digest in NonceHasher(base).scan(chunk_start, chunk_stop):
+        prev_nonce = first.setdefault(prefix_int(digest, n), nonce)
+        if prev_nonce != nonce:
+            pair = (prev_nonce, nonce)
+            break
+    # up to 16 hex symbols fit into uint64, which is much cheaper to send back than a list of ints
+    keys = array("Q", first) if n <= 16 else list(first)
+    return keys, array("Q", first.values()), pair
+
+def find_prefix_collision_parallel(base="student_test", n=4, max_attempts=2_000_000, verbose_every=100_000,
+                                   workers=None, chunk_size=50_000, table="dict"):
+    # table="compact" merges with numpy (CompactPrefixTable.insert_many)
+    assert 1 <= n <= 64, "n must be within the range of 1..64 hex characters"
+    assert table == "dict" or n <= 16, "compact table supports n up to 16"
+    # prefix (as int) -> nonce, full hashes are recomputed only for the result
+    seen = CompactPrefixTable() if table == "compact" else {}
+    tasks = [(base, n, s, min(s + chunk_size, max_attempts)) for s in range(0, max_attempts, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    start = time.time()
+
+    # leaving the "with" block terminates the pool, so all workers stop once a collision is found
+    with Pool(workers) as pool:
+        for (_, _, chunk_start, chunk_stop), (keys, nonces, pair) in zip(tasks, pool.imap(_hash_chunk, tasks)):
+            # candidates (nonce, earlier nonce); the smallest nonce is what the serial search finds
+            if table == "compact":
+                candidates = seen.insert_many(keys, nonces)
+            elif seen.keys().isdisjoint(keys):
+                candidates = []
+                seen.update(zip(keys, nonces))
+            else:
+                candidates = [(nonce, seen[prefix]) for prefix, nonce in zip(keys, nonces) if prefix in seen]
+            if pair is not None:
+                candidates.append(pair[::-1])
+            if candidates:
+                nonce, prev_nonce = min(candidates)
+                return _collision_result(base, n, prev_nonce, nonce, nonce + 1, time.time() - start, workers)
+
+            if verbose_every and chunk_stop // verbose_every > chunk_start // verbose_every:
+                print(f"[info] Verified {chunk_stop:,} nonce... (unique prefixes: {len(seen):,})")
+
+    return None  # not found within max_attempts
+
+
+# Rho mode (parallel collision search with distinguished points, van Oorschot-Wiener):
+# a nonce x is mapped to the next nonce f(x) = int(first n hex symbols of sha256(base + x)).
+# Collisions of f are exactly prefix collisions. Chains x -> f(x) -> f(f(x)) ... are walked
+# until a "distinguished point" (low dp_bits bits are zero); only those points are stored,
+# so memory stays bounded by max_points no matter how large n is.
+
+def _rho_step(hasher, n, x):
+    return prefix_int(hasher.digest(x), n)
+
+def _auto_dp_bits(n, max_points):
+    # expected walk length before a collision is about sqrt(pi/2 * 16^n),
+    # keep the expected number of stored points at ~1/4 of the limit
+    expected_steps = math.sqrt(math.pi / 2 * 16 ** n)
+    dp_bits = 0
+    while expected_steps / (1 << dp_bits) > max_points / 4:
+        dp_bits += 1
+    return dp_bits
+
+def find_prefix_collision_rho(base="student_test", n=6, max_attempts=50_000_000, dp_bits=None,
+                              max_points=1 << 16, verbose_every=1_000_000):
+    assert 1 <= n <= 64, "n must be within the range of 1..64 hex characters"
+    if dp_bits is None:
+        dp_bits = _auto_dp_bits(n, max_points)
+    dp_mask = (1 << dp_bits) - 1
+    max_chain = 20 << dp_bits  # longer chains are probably stuck in a cycle -> abandoned
+    hasher = NonceHasher(base)
+    points = {}  # distinguished point -> (chain start, chain length)
+    attempts = 0
+    next_report = verbose_every
+    start_nonce = 0
+    start = time.time()
+
+    while attempts < max_attempts:
+        x0 = x = start_nonce
+        start_nonce += 1
+        length = 0
+        while True:
+            x = _rho_step(hasher, n, x)
+            length += 1
+            if x & dp_mask == 0 or length >= max_chain:
+                break
+        attempts += length
+        if x & dp_mask:
+            continue
+
+        if x in points:
+            other_start, other_length = points[x]
+            pair, steps = _rho_locate(hasher, n, x0, length, other_start, other_length)
+            attempts += steps
+            if pair is not None:
+                return _collision_result(base, n, pair[0], pair[1], attempts, time.time() - start, 1)
+            # one chain started on the other one ("Robin Hood"), just keep walking new chains
+        else:
+            if len(points) >= max_points:
+                del points[next(iter(points))]  # drop the oldest point to stay within the limit
+            points[x] = (x0, length)
+
+        if verbose_every and attempts >= next_report:
+            next_report += verbose_every
+            print(f"[info] {attempts:,} steps... (distinguished points: {len(points):,}, dp_bits={dp_bits})")
+
+    return None
+
+def _rho_locate(hasher, n, a, len_a, b, len_b):
+    # Two chains end in the same distinguished point: walk them again from their starts
+    # (aligned by length) and return the last pair of different nonces before they merge.
+    steps = 0
+    while len_a > len_b:
+        a = _rho_step(hasher, n, a)
+        len_a -= 1
+        steps += 1
+    while len_b > len_a:
+        b = _rho_step(hasher, n, b)
+        len_b -= 1
+        steps += 1
+    if a == b:
+        return None, steps
+    while True:
+        next_a, next_b = _rho_step(hasher, n, a), _rho_step(hasher, n, b)
+        steps += 2
+        if next_a == next_b:
+            return (a, b), steps
+        a, b = next_a, next_b
+
 if __name__ == "__main__":
     # Settings
     BASE = "student_test"
     N = 5              # change 1-5 to set the prefix length
     MAX_ATTEMPTS = 5_000_000
+    WORKERS = 1        # None = one worker per CPU core
+    MODE = "table"     # "table" = prefix table, "rho" = distinguished points (bounded memory, n > 6)
 
-    res = find_prefix_collision(base=BASE, n=N, max_attempts=MAX_ATTEMPTS)
+    if MODE == "rho":
+        res = find_prefix_collision_rho(base=BASE, n=N, max_attempts=MAX_ATTEMPTS)
+    else:
+        res = find_prefix_collision(base=BASE, n=N, max_attempts=MAX_ATTEMPTS, workers=WORKERS)
     print("\nResult")
     if res is None:
         print(f"Collision by prefix with n={N} not found within {MAX_ATTEMPTS:,} attempts.")
@@ -48,6 +283,7 @@ if __name__ == "__main__":
         print(f"A collision was found for the length prefix n={res['n']}!")
         print(f"Number of attempts: {res['attempts']:,}")
         print(f"Search time: {res['elapsed_sec']:.3f} c")
+        print(f"Speed: {res['attempts_per_sec']:,.0f} attempts/sec ({res['workers']} worker(s))")
         print("\n— Line A:")
         print(f"   nonce:  {res['a']['nonce']}")
         print(f"   value:  {res['a']['string']}")
@@ -1,34 +1,17 @@
-﻿from cryptography.hazmat.primitives.asymmetric import rsa, padding
+﻿from cryptography.hazmat.primitives.asymmetric import rsa, padding, utils
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.exceptions import InvalidSignature
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import base64
-
-
-# 1. Key generation (RSA-2048)
-
-# Generate RSA-2048 key pair (private + public)
-private_key = rsa.generate_private_key(
-    public_exponent=65537,
-    key_size=2048
-)
-public_key = private_key.public_key()
-
-# Serialize public key to PEM format
-public_pem = public_key.public_bytes(
-    encoding=serialization.Encoding.PEM,
-    format=serialization.PublicFormat.SubjectPublicKeyInfo
-)
+import hashlib
+import mmap
+import os
+import threading
 
 
 # 2. "Document" representation
 
-# Example document with identifier and content
-document = {
-    "id": "DOC-001",
-    "content": "This is an important educational document about blockchain."
-}
-
-
 def document_to_bytes(doc: dict) -> bytes:
     s = f"{doc['id']}|{doc['content']}"
     return s.encode("utf-8")
@@ -38,86 +21,213 @@ def document_to_bytes(doc: dict) -> bytes:
 
 def sign_document(doc: dict, priv_key) -> bytes:
     data = document_to_bytes(doc)
-    signature = priv_key.sign(
-        data,
-        padding.PSS(
-            mgf=padding.MGF1(hashes.SHA256()),
-            salt_length=padding.PSS.MAX_LENGTH
-        ),
-        hashes.SHA256()
-    )
+    signature = priv_key.sign(data, pss_padding(), hashes.SHA256())
     return signature
 
 
 # 4. Verification function
 
 def verify_document(doc: dict, signature: bytes, public_key_pem: bytes) -> bool:
-    # Recreate public key object from PEM
-    pub_key = serialization.load_pem_public_key(public_key_pem)
+    # Public key object from PEM (parsed once per key, see load_public_key)
+    pub_key = load_public_key(public_key_pem)
     data = document_to_bytes(doc)
     try:
-        pub_key.verify(
-            signature,
-            data,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+        pub_key.verify(signature, data, pss_padding(), hashes.SHA256())
         return True
     except InvalidSignature:
         return False
 
 
-# 5. Simulate "sending" document + signature + public key
+# Parsed public keys, keyed by SHA-256 fingerprint of the PEM (LRU)
+
+PUBLIC_KEY_CACHE_SIZE = 256
+_public_keys = OrderedDict()
+_public_keys_lock = threading.Lock()
+
+
+def key_fingerprint(public_key_pem: bytes) -> bytes:
+    return hashlib.sha256(public_key_pem).digest()
+
+
+def load_public_key(public_key_pem: bytes):
+    fingerprint = key_fingerprint(public_key_pem)
+    with _public_keys_lock:
+        pub_key = _public_keys.get(fingerprint)
+        if pub_key is not None:
+            _public_keys.move_to_end(fingerprint)
+            return pub_key
+
+    pub_key = serialization.load_pem_public_key(public_key_pem)
+    with _public_keys_lock:
+        _public_keys[fingerprint] = pub_key
+        if len(_public_keys) > PUBLIC_KEY_CACHE_SIZE:
+            _public_keys.popitem(last=False)
+    return pub_key
+
+
+# Batch API: RSA operations run in OpenSSL without the GIL, so a thread pool
+# spreads them over all cores. Results are returned in input order.
 
-signature = sign_document(document, private_key)
-signature_b64 = base64.b64encode(signature).decode()
+def sign_documents(docs, priv_key, max_workers=None) -> list:
+    with ThreadPoolExecutor(max_workers) as pool:
+        return list(pool.map(lambda doc: sign_document(doc, priv_key), docs))
 
-# Short print of public key
-print("Public key (short view)")
-pub_flat = public_pem.decode().replace("\n", "")
-print(pub_flat[:80] + " ... " + pub_flat[-80:], "\n")
 
-print("Original document")
-print(f"ID:      {document['id']}")
-print(f"Content: {document['content']}\n")
+def _verify_item(item) -> bool:
+    # a malformed / unsupported key or signature only fails its own document
+    try:
+        return verify_document(*item)
+    except (ValueError, TypeError):
+        return False
 
-print("Signature (Base64, shortened):")
-print(signature_b64[:80] + " ...\n")
 
+def verify_documents(items, max_workers=None) -> list:
+    # items: iterable of (doc, signature, public_key_pem)
+    with ThreadPoolExecutor(max_workers) as pool:
+        return list(pool.map(_verify_item, items))
+
+
+# Streaming sign/verify for large documents: id, "|" and content are fed into an
+# incremental SHA-256 and the digest is signed in prehashed mode. The digest equals
+# SHA-256(document_to_bytes(doc)), so the signatures are interchangeable with
+# sign_document/verify_document for the same document.
+
+STREAM_CHUNK_SIZE = 1 << 20
+
+
+def document_digest(doc_id: str, content) -> bytes:
+    # content can be:
+    #   str / bytes / bytearray / memoryview / mmap  - hashed as is (str as UTF-8)
+    #   os.PathLike (e.g. pathlib.Path)              - file is memory-mapped
+    #   binary file object                           - read in STREAM_CHUNK_SIZE pieces
+    #   iterable of bytes or str chunks
+    h = hashlib.sha256(f"{doc_id}|".encode("utf-8"))
+    if isinstance(content, str):
+        h.update(content.encode("utf-8"))
+    elif isinstance(content, (bytes, bytearray, memoryview, mmap.mmap)):
+        h.update(content)
+    elif isinstance(content, os.PathLike):
+        with open(content, "rb") as f:
+            if os.fstat(f.fileno()).st_size:  # empty files cannot be mapped
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    h.update(m)
+    elif hasattr(content, "readinto"):
+        buf = bytearray(STREAM_CHUNK_SIZE)
+        view = memoryview(buf)
+        while True:
+            size = content.readinto(buf)
+            if not size:
+                break
+            h.update(view[:size])
+    else:
+        for chunk in content:
+            h.update(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+    return h.digest()
+
+
+def pss_padding():
+    # RSA-PSS padding of all RSA signatures here: MGF1 with SHA-256, maximum salt length
+    return padding.PSS(
+        mgf=padding.MGF1(hashes.SHA256()),
+        salt_length=padding.PSS.MAX_LENGTH
+    )
 
-# 6. Three verification cases
 
-# (a) Genuine document - verification passes
-print(" (a) Genuine document")
-is_valid_a = verify_document(document, signature, public_pem)
-print("Verification result:", is_valid_a)
+def sign_document_stream(doc_id: str, content, priv_key) -> bytes:
+    digest = document_digest(doc_id, content)
+    return priv_key.sign(digest, pss_padding(), utils.Prehashed(hashes.SHA256()))
 
-# (b) Document content is modified - verification fails
-print("\n(b) Document MODIFIED")
-tampered_document = {
-    "id": document["id"],
-    "content": document["content"] + " (edited)"
-}
-is_valid_b = verify_document(tampered_document, signature, public_pem)
-print("New content:", tampered_document["content"])
-print("Verification result:", is_valid_b)
 
-# (c) Signature is replaced (for another document) - verification fails
-print("\n(c) Signature REPLACED")
-fake_document = {
-    "id": "DOC-FAKE",
-    "content": "Fake document signed with the same private key."
-}
-fake_signature = sign_document(fake_document, private_key)
-fake_sig_b64 = base64.b64encode(fake_signature).decode()
+def verify_document_stream(doc_id: str, content, signature: bytes, public_key_pem: bytes) -> bool:
+    pub_key = load_public_key(public_key_pem)
+    digest = document_digest(doc_id, content)
+    try:
+        pub_key.verify(signature, digest, pss_padding(), utils.Prehashed(hashes.SHA256()))
+        return True
+    except InvalidSignature:
+        return False
+
+
+if __name__ == "__main__":
+    # 1. Key generation (RSA-2048)
+
+    # Generate RSA-2048 key pair (private + public)
+    private_key = rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=2048
+    )
+    public_key = private_key.public_key()
+
+    # Serialize public key to PEM format
+    public_pem = public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
 
-is_valid_c = verify_document(document, fake_signature, public_pem)
-print("Fake signature (Base64, shortened):")
-print(fake_sig_b64[:80] + " ...")
-print("Verification result:", is_valid_c)
+    # Example document with identifier and content
+    document = {
+        "id": "DOC-001",
+        "content": "This is an important educational document about blockchain."
+    }
+
+
+    # 5. Simulate "sending" document + signature + public key
+
+    signature = sign_document(document, private_key)
+    signature_b64 = base64.b64encode(signature).decode()
+
+    # Short print of public key
+    print("Public key (short view)")
+    pub_flat = public_pem.decode().replace("\n", "")
+    print(pub_flat[:80] + " ... " + pub_flat[-80:], "\n")
+
+    print("Original document")
+    print(f"ID:      {document['id']}")
+    print(f"Content: {document['content']}\n")
+
+    print("Signature (Base64, shortened):")
+    print(signature_b64[:80] + " ...\n")
+
+
+    # 6. Three verification cases
+
+    # (a) Genuine document - verification passes
+    print(" (a) Genuine document")
+    is_valid_a = verify_document(document, signature, public_pem)
+    print("Verification result:", is_valid_a)
+
+    # (b) Document content is modified - verification fails
+    print("\n(b) Document MODIFIED")
+    tampered_document = {
+        "id": document["id"],
+        "content": document["content"] + " (edited)"
+    }
+    is_valid_b = verify_document(tampered_document, signature, public_pem)
+    print("New content:", tampered_document["content"])
+    print("Verification result:", is_valid_b)
+
+    # (c) Signature is replaced (for another document) - verification fails
+    print("\n(c) Signature REPLACED")
+    fake_document = {
+        "id": "DOC-FAKE",
+        "content": "Fake document signed with the same private key."
+    }
+    fake_signature = sign_document(fake_document, private_key)
+    fake_sig_b64 = base64.b64encode(fake_signature).decode()
+
+    is_valid_c = verify_document(document, fake_signature, public_pem)
+    print("Fake signature (Base64, shortened):")
+    print(fake_sig_b64[:80] + " ...")
+    print("Verification result:", is_valid_c)
+
+    # (d) Batch verification - the same three cases in one call
+    print("\n(d) Batch verification")
+    batch = [
+        (document, signature, public_pem),
+        (tampered_document, signature, public_pem),
+        (document, fake_signature, public_pem),
+    ]
+    print("Verification results:", verify_documents(batch))
 
 #                               Пояснення
 #Випадок (а): Оригінальний документ з правильним підписом успішно перевірено.
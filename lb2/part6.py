@@ -2,12 +2,19 @@
 import time
 import json
 
+from block_header import NONCE, NONCE_OFFSET, header_hash, pack_header
+from merkle_tree import MerkleTree, tx_digest
+from miner import mine_header, target_from_bits
+from transaction import Transaction
+
 
 def sha256(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
-def hash_tx(tx: dict) -> str:
+def hash_tx(tx) -> str:
+    if isinstance(tx, Transaction):
+        return tx.txid  # cached until the tx changes
     tx_str = json.dumps(tx, sort_keys=True)
     return sha256(tx_str)
 
@@ -39,116 +46,224 @@ def build_merkle_tree(txs):
 
 
 class Block:
-    def __init__(self, index, txs, prev_hash):
+    # header_format (set in __init__, "binary" for new blocks):
+    #   "binary" - fixed 84-byte header (block_header.py), hashed as raw bytes
+    #   "text"   - old "prevHash|timestamp|merkleRoot" string, for blocks created before
+    # PoW fields, set by mine(); text blocks that were never mined keep the old
+    # 3-field header (prevHash | timestamp | merkleRoot)
+    difficulty = None  # required leading zero bits of the hash
+    nonce = None
+    _merkle_levels = None  # levels_hex() of merkle_tree, reset whenever the txs change
+
+    def __init__(self, index, txs, prev_hash, header_format="binary"):
         self.index = index
         self.timestamp = int(time.time())
         self.transactions = txs
         self.prev_hash = prev_hash
+        self.header_format = header_format
 
-        # build Merkle tree and root
-        self.merkle_levels = build_merkle_tree(self.transactions)
-        self.merkle_root = self.merkle_levels[-1][0]
+        # build Merkle tree and root (legacy = same hashes as build_merkle_tree)
+        self.merkle_tree = MerkleTree.from_transactions(self.transactions, legacy=True)
+        self.merkle_root = self.merkle_tree.root_hex()
 
         # no real PoW, just hash header once
         self.hash = self.calculate_hash()
 
+    @property
+    def merkle_levels(self):
+        if self._merkle_levels is None:
+            self._merkle_levels = self.merkle_tree.levels_hex()
+        return self._merkle_levels
+
+    def append_tx(self, tx):
+        # add one tx, only the path of the new leaf is rehashed
+        self.transactions.append(tx)
+        self.merkle_tree.append(tx_digest(tx))
+        self._update_header()
+
+    def update_tx(self, i, tx):
+        # replace (or re-hash after an in-place change) tx number i
+        self.transactions[i] = tx
+        self.merkle_tree.update(i, tx_digest(tx))
+        self._update_header()
+
+    def _update_header(self):
+        # note: for a mined block the new hash will not meet the target until mine() again
+        self._merkle_levels = None
+        self.merkle_root = self.merkle_tree.root_hex()
+        self.hash = self.calculate_hash()
+
+    def header_bytes(self):
+        return pack_header(bytes.fromhex(self.prev_hash), bytes.fromhex(self.merkle_root),
+                           self.timestamp, self.difficulty or 0, self.nonce or 0)
+
+    def header_prefix(self):
+        # header without the nonce, the part a miner hashes only once
+        if self.header_format == "binary":
+            return self.header_bytes()[:NONCE_OFFSET]
+        # text: prevHash | timestamp | merkleRoot | difficulty |
+        return f"{self.prev_hash}|{self.timestamp}|{self.merkle_root}|{self.difficulty}|"
+
     def header_string(self):
-        # header fields: prevHash | timestamp | merkleRoot
-        return f"{self.prev_hash}|{self.timestamp}|{self.merkle_root}"
+        if self.nonce is None:
+            # header fields: prevHash | timestamp | merkleRoot
+            return f"{self.prev_hash}|{self.timestamp}|{self.merkle_root}"
+        return f"{self.header_prefix()}{self.nonce}"
 
     def calculate_hash(self):
+        if self.header_format == "binary":
+            return header_hash(self.header_bytes()).hex()
         return sha256(self.header_string())
 
+    def meets_target(self):
+        return self.difficulty is None or int(self.hash, 16) <= target_from_bits(self.difficulty)
+
+    def mine(self, difficulty_bits, workers=1, cancel=None):
+        # Real PoW: search a nonce so that the block hash has difficulty_bits leading zero bits.
+        # workers=None -> one process per CPU core; cancel.set() stops the search (returns None).
+        old_difficulty, self.difficulty = self.difficulty, difficulty_bits
+        nonce_struct = NONCE if self.header_format == "binary" else None
+        result = mine_header(self.header_prefix(), target_from_bits(difficulty_bits), workers, cancel,
+                             nonce_struct=nonce_struct)
+        if result is None:
+            self.difficulty = old_difficulty  # cancelled, block stays as it was
+            return None
+        self.nonce = result["nonce"]
+        self.hash = result["hash"]
+        return result
+
 
 def create_genesis_block():
     txs = [{"from": "GENESIS", "to": "GENESIS", "amount": 0}]
     return Block(0, txs, "0" * 64)
 
 
-def is_chain_valid(chain):
-    for i in range(1, len(chain)):
+def check_block(block, verifier=None):
+    # Checks of one block that do not depend on other blocks:
+    # merkle root from the txs and block hash from the header.
+    # verifier (tx_signing.TxVerifier) also requires every tx to be signed by its sender.
+    # Returns None if the block is ok, otherwise the reason.
+
+    # recompute merkle root
+    new_root = MerkleTree.from_transactions(block.transactions, legacy=True).root_hex()
+    if block.merkle_root != new_root:
+        return "merkleRoot mismatch"
+
+    # recompute block hash
+    if block.hash != block.calculate_hash():
+        return "hash mismatch"
+
+    # proof of work
+    if not block.meets_target():
+        return "hash above target"
+
+    # signatures last, the most expensive check
+    if verifier is not None:
+        return verifier.check_block(block)
+
+    return None
+
+
+def chain_error(chain, i, reason):
+    return {"valid": False, "index": i, "block_index": chain[i].index, "reason": reason}
+
+
+def validate_chain(chain, start=1, min_difficulty=0, verifier=None):
+    # Same checks as is_chain_valid, but the first failure is returned as data:
+    # {"valid": bool, "index": position in chain, "block_index": block.index, "reason": str}
+    # min_difficulty > 0 also requires every block to be mined with at least that many bits.
+    for i in range(max(start, 1), len(chain)):
         block = chain[i]
-        prev_block = chain[i - 1]
+
+        if min_difficulty and (block.difficulty or 0) < min_difficulty:
+            return chain_error(chain, i, "difficulty too low")
 
         # check prevHash
-        if block.prev_hash != prev_block.hash:
-            print(f"[ERROR] Block {block.index}: prev_hash mismatch")
-            return False
-
-        # recompute merkle root
-        new_levels = build_merkle_tree(block.transactions)
-        new_root = new_levels[-1][0]
-        if block.merkle_root != new_root:
-            print(f"[ERROR] Block {block.index}: merkleRoot mismatch")
-            return False
-
-        # recompute block hash
-        new_hash = sha256(f"{block.prev_hash}|{block.timestamp}|{block.merkle_root}")
-        if block.hash != new_hash:
-            print(f"[ERROR] Block {block.index}: hash mismatch")
-            return False
-
-    return True
-
-
-# 1. create simple "blockchain"
-chain = []
-genesis = create_genesis_block()
-chain.append(genesis)
-
-# block 1 with some txs
-txs1 = [
-    {"from": "Alice", "to": "Bob", "amount": 10},
-    {"from": "Bob", "to": "Charlie", "amount": 5},
-    {"from": "Charlie", "to": "Dave", "amount": 2},
-    {"from": "Dave", "to": "Alice", "amount": 1},
-]
-
-block1 = Block(1, txs1, genesis.hash)
-chain.append(block1)
-
-# 2. print tx list and merkle tree
-print("=== Block 1 transactions ===")
-for t in block1.transactions:
-    print(t)
-print()
-
-print("=== Merkle tree levels (0 = leaves) ===")
-for i, level in enumerate(block1.merkle_levels):
-    # show first 12 chars to keep output short
-    short_level = [h[:12] + "..." for h in level]
-    print(f"Level {i}: {short_level}")
-print()
-
-print("Merkle root:", block1.merkle_root)
-print("Block 1 hash:", block1.hash)
-print("Chain valid before tamper?:", is_chain_valid(chain))
-
-# 3. change one transaction (minimal change)
-print("\n--- Tampering: change amount in first tx ---")
-print("Old tx[0]:", block1.transactions[0])
-block1.transactions[0]["amount"] = 999  # changed from 10 to 999
-print("New tx[0]:", block1.transactions[0])
-
-print("\nChain valid after tamper?:", is_chain_valid(chain))
-
-# 4. show how merkleRoot and block hash WOULD change if we recompute them
-new_levels = build_merkle_tree(block1.transactions)
-new_root = new_levels[-1][0]
-new_hash = sha256(f"{block1.prev_hash}|{block1.timestamp}|{new_root}")
-
-print("\n--- Recomputed values (not saved in block) ---")
-print("Old merkleRoot:", block1.merkle_root)
-print("New merkleRoot:", new_root)
-print("Old block hash:", block1.hash)
-print("New block hash:", new_hash)
-
-# 5. "remine" / fix block manually (just recalc root + hash)
-print("\n--- Fix block (\"re-mining\" without PoW) ---")
-block1.merkle_levels = new_levels
-block1.merkle_root = new_root
-block1.hash = block1.calculate_hash()
-
-print("New stored merkleRoot:", block1.merkle_root)
-print("New stored block hash:", block1.hash)
-print("Chain valid after recompute?:", is_chain_valid(chain))
\ No newline at end of file
+        if block.prev_hash != chain[i - 1].hash:
+            return chain_error(chain, i, "prev_hash mismatch")
+
+        reason = check_block(block, verifier)
+        if reason is not None:
+            return chain_error(chain, i, reason)
+
+    return {"valid": True, "index": None, "block_index": None, "reason": None}
+
+
+def is_chain_valid(chain, min_difficulty=0, verifier=None):
+    result = validate_chain(chain, min_difficulty=min_difficulty, verifier=verifier)
+    if not result["valid"]:
+        print(f"[ERROR] Block {result['block_index']}: {result['reason']}")
+    return result["valid"]
+
+
+if __name__ == "__main__":
+    # 1. create simple "blockchain"
+    chain = []
+    genesis = create_genesis_block()
+    chain.append(genesis)
+
+    # block 1 with some txs
+    txs1 = Transaction.from_dicts([
+        {"from": "Alice", "to": "Bob", "amount": 10},
+        {"from": "Bob", "to": "Charlie", "amount": 5},
+        {"from": "Charlie", "to": "Dave", "amount": 2},
+        {"from": "Dave", "to": "Alice", "amount": 1},
+    ])
+
+    block1 = Block(1, txs1, genesis.hash)
+    chain.append(block1)
+
+    # 2. print tx list and merkle tree
+    print("=== Block 1 transactions ===")
+    for t in block1.transactions:
+        print(t)
+    print()
+
+    print("=== Merkle tree levels (0 = leaves) ===")
+    for i, level in enumerate(block1.merkle_levels):
+        # show first 12 chars to keep output short
+        short_level = [h[:12] + "..." for h in level]
+        print(f"Level {i}: {short_level}")
+    print()
+
+    print("Merkle root:", block1.merkle_root)
+    print("Block 1 hash:", block1.hash)
+    print("Chain valid before tamper?:", is_chain_valid(chain))
+
+    # 3. change one transaction (minimal change)
+    print("\n--- Tampering: change amount in first tx ---")
+    print("Old tx[0]:", block1.transactions[0])
+    block1.transactions[0]["amount"] = 999  # changed from 10 to 999
+    print("New tx[0]:", block1.transactions[0])
+
+    print("\nChain valid after tamper?:", is_chain_valid(chain))
+
+    # 4. show how merkleRoot and block hash WOULD change if we recompute them
+    new_levels = build_merkle_tree(block1.transactions)
+    new_root = new_levels[-1][0]
+    new_hash = header_hash(pack_header(bytes.fromhex(block1.prev_hash), bytes.fromhex(new_root),
+                                       block1.timestamp)).hex()
+
+    print("\n--- Recomputed values (not saved in block) ---")
+    print("Old merkleRoot:", block1.merkle_root)
+    print("New merkleRoot:", new_root)
+    print("Old block hash:", block1.hash)
+    print("New block hash:", new_hash)
+
+    # 5. "remine" / fix block (recalc only the path of tx[0] + hash)
+    print("\n--- Fix block (\"re-mining\" without PoW) ---")
+    block1.update_tx(0, block1.transactions[0])
+
+    print("New stored merkleRoot:", block1.merkle_root)
+    print("New stored block hash:", block1.hash)
+    print("Chain valid after recompute?:", is_chain_valid(chain))
+
+    # 6. real PoW: mine block 2 (hash must start with 16 zero bits)
+    print("\n--- Mining block 2 (difficulty 16 bits) ---")
+    block2 = Block(2, [{"from": "Bob", "to": "Alice", "amount": 3}], block1.hash)
+    stats = block2.mine(16)
+    chain.append(block2)
+    print("Nonce:", block2.nonce)
+    print("Block 2 hash:", block2.hash)
+    print(f"Attempts: {stats['attempts']:,}, hashrate: {stats['hashrate']:,.0f} H/s")
+    print("Chain valid with mined block?:", is_chain_valid(chain))
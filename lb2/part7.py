@@ -1,5 +1,10 @@
 ﻿import hashlib
 import json
+import time
+
+from block_header import header_hash, pack_header
+from merkle_tree import MerkleTree, tx_digest
+from transaction import Transaction
 
 
 def sha256(s: str) -> str:
@@ -7,8 +12,11 @@ def sha256(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
-def hash_tx(tx: dict) -> str:
+def hash_tx(tx) -> str:
     #Hash a transaction object using JSON with sorted keys.
+    #Transaction objects give the same hash, computed once and cached.
+    if isinstance(tx, Transaction):
+        return tx.txid
     tx_str = json.dumps(tx, sort_keys=True)
     return sha256(tx_str)
 
@@ -45,19 +53,40 @@ def build_merkle_tree(txs):
     return levels
 
 
-def getMerkleProof(txId: str, merkle_levels):
+def build_leaf_index(merkle_levels) -> dict:
+
+    #txId -> leaf position (first occurrence, same as leaves.index(txId)).
+    #Build once per block and pass it to getMerkleProof/getMerkleProofs/getMultiProof.
+
+    index = {}
+    for i, leaf in enumerate(merkle_levels[0]):
+        index.setdefault(leaf, i)
+    return index
+
+
+def getMerkleProof(txId: str, merkle_levels, leaf_index=None):
     
     #Build Merkle proof for given txId (leaf hash).
     #Returns a list of {"hash": sibling_hash, "position": "left"/"right"}.
     #- "left"  means: sibling is on the left, so parent = H(sibling + current)
     #- "right" means: sibling is on the right, so parent = H(current + sibling)
     #If txId not found in leaves -> returns None.
+    #leaf_index (from build_leaf_index) replaces the linear search in leaves.
     
-    leaves = merkle_levels[0]
-    if txId not in leaves:
-        return None
+    if leaf_index is not None:
+        index = leaf_index.get(txId)
+        if index is None:
+            return None
+    else:
+        leaves = merkle_levels[0]
+        if txId not in leaves:
+            return None
+        index = leaves.index(txId)
+
+    return _proof_for_index(index, merkle_levels)
 
-    index = leaves.index(txId)
+
+def _proof_for_index(index: int, merkle_levels):
     proof = []
 
     # Go up from leaves to root
@@ -81,6 +110,85 @@ def getMerkleProof(txId: str, merkle_levels):
     return proof
 
 
+def getMerkleProofs(txIds, merkle_levels, leaf_index=None):
+
+    #Batch version of getMerkleProof: one proof (or None) per txId, in the same order.
+
+    if leaf_index is None:
+        leaf_index = build_leaf_index(merkle_levels)
+    return [getMerkleProof(txId, merkle_levels, leaf_index) for txId in txIds]
+
+
+def getMultiProof(txIds, merkle_levels, leaf_index=None):
+
+    #Compact proof for many txs of one block. Siblings shared by several paths
+    #(or nodes that the verifier computes itself) are sent only once.
+    #Returns {"leaf_count": n, "indices": [leaf index per txId], "hashes": [...]}
+    #or None if any txId is not in the block.
+    #"hashes" are listed level by level, in increasing node index order.
+
+    if leaf_index is None:
+        leaf_index = build_leaf_index(merkle_levels)
+    indices = [leaf_index.get(txId) for txId in txIds]
+    if None in indices:
+        return None
+
+    hashes = []
+    known = sorted(set(indices))
+    for level in merkle_levels[:-1]:  # skip last (root) level
+        known_set = set(known)
+        for index in known:
+            sibling_index = index ^ 1
+            # duplicated last node or sibling computed by the verifier -> nothing to send
+            if sibling_index < len(level) and sibling_index not in known_set:
+                hashes.append(level[sibling_index])
+        known = sorted({index // 2 for index in known})
+
+    return {"leaf_count": len(merkle_levels[0]), "indices": indices, "hashes": hashes}
+
+
+def verifyMultiProof(txIds, multiproof, merkleRoot: str) -> bool:
+
+    #Verify a proof from getMultiProof for the same list of txIds.
+
+    indices = multiproof["indices"]
+    size = multiproof["leaf_count"]
+    if len(indices) != len(txIds):
+        return False
+
+    nodes = {}  # index -> hash on the current level
+    for index, txId in zip(indices, txIds):
+        if not 0 <= index < size or nodes.setdefault(index, txId) != txId:
+            return False
+
+    hashes = iter(multiproof["hashes"])
+    while size > 1:
+        parents = {}
+        for index in sorted(nodes):
+            if index // 2 in parents:
+                continue  # pair already hashed from its left node
+            current = nodes[index]
+            sibling_index = index ^ 1
+            if sibling_index >= size:
+                sibling = current  # duplicated last node
+            elif sibling_index in nodes:
+                sibling = nodes[sibling_index]
+            else:
+                sibling = next(hashes, None)
+                if sibling is None:
+                    return False
+            if index % 2 == 0:
+                parents[index // 2] = sha256(current + sibling)
+            else:
+                parents[index // 2] = sha256(sibling + current)
+        nodes = parents
+        size = (size + 1) // 2
+
+    if next(hashes, None) is not None:
+        return False  # unused hashes -> malformed proof
+    return nodes.get(0) == merkleRoot
+
+
 def verifyProof(txId: str, proof, merkleRoot: str) -> bool:
     
     #Verify Merkle proof using only:
@@ -101,19 +209,107 @@ def verifyProof(txId: str, proof, merkleRoot: str) -> bool:
     return current == merkleRoot
 
 
+def verify_proofs(merkleRoot: str, items) -> list:
+
+    #Batch version of verifyProof for many (txId, proof) items of the same block.
+    #Returns one bool per item, in order.
+    #- every (left, right) -> parent hash is computed once per batch;
+    #- nodes of verified paths are remembered with their children, so the next proof
+    #  is checked from the root down through the already known part of the tree:
+    #  a wrong sibling there fails at once, and the hashing stops where the known part starts.
+    #A node has only one possible (left, right) pair (SHA-256 collision resistance),
+    #so the result is the same as verifyProof for every item.
+
+    children = {}  # node hash on a verified path -> (left, right)
+    parents = {}   # (left, right) -> parent hash
+    results = []
+
+    for txId, proof in items:
+        # 1) from the root down, while the tree is already known
+        expected = merkleRoot
+        depth = len(proof)
+        ok = True
+        while depth and expected in children:
+            left, right = children[expected]
+            step = proof[depth - 1]
+            if step["position"] == "left":
+                ok, expected = step["hash"] == left, right
+            else:  # "right"
+                ok, expected = step["hash"] == right, left
+            if not ok:
+                break
+            depth -= 1
+        if not ok:
+            results.append(False)
+            continue
+
+        # 2) from the leaf up to the first known node
+        current = txId
+        path = []
+        for step in proof[:depth]:
+            if step["position"] == "left":
+                pair = (step["hash"], current)
+            else:  # "right"
+                pair = (current, step["hash"])
+            parent = parents.get(pair)
+            if parent is None:
+                parent = parents[pair] = sha256(pair[0] + pair[1])
+            path.append((parent, pair))
+            current = parent
+
+        if current != expected:
+            results.append(False)
+            continue
+        for parent, pair in path:
+            children[parent] = pair
+        results.append(True)
+
+    return results
+
+
 #SIMPLE BLOCK
 
 class Block:
     def __init__(self, index, txs, prev_hash):
         self.index = index
+        self.timestamp = int(time.time())
         self.txs = txs
         self.prev_hash = prev_hash
-        # build Merkle tree
-        self.merkle_levels = build_merkle_tree(self.txs)
-        self.merkle_root = self.merkle_levels[-1][0]
-        # very simple header hash (no PoW)
-        header_str = f"{self.prev_hash}|{self.merkle_root}"
-        self.hashHeader = sha256(header_str)
+        # build Merkle tree (legacy = same hashes as build_merkle_tree)
+        self.merkle_tree = MerkleTree.from_transactions(self.txs, legacy=True)
+        self._update_header()
+
+    @property
+    def merkle_levels(self):
+        # hex levels and the txId index are built once and reused for all proofs
+        if self._merkle_levels is None:
+            self._merkle_levels = self.merkle_tree.levels_hex()
+        return self._merkle_levels
+
+    @property
+    def leaf_index(self):
+        if self._leaf_index is None:
+            self._leaf_index = build_leaf_index(self.merkle_levels)
+        return self._leaf_index
+
+    def append_tx(self, tx):
+        # add one tx, only the path of the new leaf is rehashed
+        self.txs.append(tx)
+        self.merkle_tree.append(tx_digest(tx))
+        self._update_header()
+
+    def update_tx(self, i, tx):
+        self.txs[i] = tx
+        self.merkle_tree.update(i, tx_digest(tx))
+        self._update_header()
+
+    def _update_header(self):
+        self._merkle_levels = None
+        self._leaf_index = None
+        self.merkle_root = self.merkle_tree.root_hex()
+        # binary header (block_header.py), no PoW
+        self.header = pack_header(bytes.fromhex(self.prev_hash), bytes.fromhex(self.merkle_root), self.timestamp)
+        self.hashHeader = header_hash(self.header).hex()
 
 
 # LIGHT CLIENT WITH MERKLE PROOF
@@ -141,7 +337,7 @@ if __name__ == "__main__":
     real_txId = hash_tx(real_tx)
 
     # Full node computes Merkle proof for this txId
-    proof = getMerkleProof(real_txId, block.merkle_levels)
+    proof = getMerkleProof(real_txId, block.merkle_levels, block.leaf_index)
 
     # "Light client" only knows:
     # - txId
@@ -186,3 +382,17 @@ if __name__ == "__main__":
     print("proof (for other tx):", print_proof(proof))
     result3 = verifyProof(fake_txId, proof, block.merkle_root)
     print("verifyProof ->", result3)
+    print()
+
+    # 4) several txs at once -> one multiproof with shared siblings sent once
+    print("Case 4: multiproof for 3 txs")
+    batch_ids = [hash_tx(tx) for tx in txs[:3]]
+    multiproof = getMultiProof(batch_ids, block.merkle_levels, block.leaf_index)
+    print("indices:", multiproof["indices"], "hashes sent:", len(multiproof["hashes"]))
+    print("verifyMultiProof ->", verifyMultiProof(batch_ids, multiproof, block.merkle_root))
+    print()
+
+    # 5) batch verification of many proofs against the same root
+    print("Case 5: batch verification")
+    batch = [(real_txId, proof), (real_txId, fake_proof), (fake_txId, proof)]
+    print("verify_proofs ->", verify_proofs(block.merkle_root, batch))
@@ -0,0 +1,345 @@
+﻿import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+
+from part7 import build_leaf_index, getMerkleProofs, verifyProof
+
+
+# Full node serving block headers and Merkle proofs to light clients over TCP.
+#
+# Protocol: one JSON object per line in both directions, on a persistent connection.
+#   {"id": 1, "method": "tip"}                                  -> {"id": 1, "result": height}
+#   {"id": 2, "method": "header", "height": h}                  -> {"id": 2, "result": {...header fields}}
+#   {"id": 3, "method": "proof", "height": h, "txId": "..."}    -> {"id": 3, "result": {"proof", "merkle_root"}}
+#   {"id": 4, "method": "txids", "height": h, "limit": n}       -> {"id": 4, "result": [txId, ...]}
+# Errors come back as {"id": ..., "error": "reason"}.
+#
+# Clients may pipeline: send many requests without waiting. Every request runs as
+# its own task and responses are written back in request order.
+# Proof requests for the same block that arrive in the same event loop turn are
+# coalesced into one getMerkleProofs call. Hex Merkle levels + leaf index of hot
+# blocks are kept in an LRU cache; a missing entry is built once in a thread even
+# if many requests wait for it.
+
+CACHE_SIZE = 64          # blocks with cached Merkle levels
+MAX_PIPELINE = 1024      # unanswered requests per connection before reading pauses
+
+
+class ProofNode:
+    def __init__(self, chain, cache_size=CACHE_SIZE):
+        self.chain = chain  # list of part6 blocks or a BlockStore
+        self.cache_size = cache_size
+        self._levels = collections.OrderedDict()  # (height, block hash) -> (levels, leaf_index)
+        self._loading = {}                        # key -> future of a levels build in progress
+        self._batches = {}                        # height -> [(txId, future), ...] not yet computed
+        self.stats = {"requests": 0, "proofs": 0, "batches": 0, "cache_hits": 0, "cache_misses": 0}
+
+    # Merkle levels cache
+
+    async def levels(self, height):
+        block = self.chain[height]
+        key = (height, block.hash)
+        entry = self._levels.get(key)
+        if entry is not None:
+            self._levels.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return entry
+        if key in self._loading:
+            return await self._loading[key]
+
+        self.stats["cache_misses"] += 1
+        loop = asyncio.get_running_loop()
+        future = self._loading[key] = loop.create_future()
+        try:
+            entry = await loop.run_in_executor(None, _build_levels, block)
+            self._levels[key] = entry
+            if len(self._levels) > self.cache_size:
+                self._levels.popitem(last=False)
+            future.set_result(entry)
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            del self._loading[key]
+        return entry
+
+    # request handlers
+
+    async def proof(self, height, tx_id):
+        self._check_height(height)
+        if not isinstance(tx_id, str):
+            raise ValueError("txId must be a string")
+        batch = self._batches.get(height)
+        if batch is None:
+            batch = self._batches[height] = []
+            asyncio.get_running_loop().call_soon(self._start_batch, height)
+        future = asyncio.get_running_loop().create_future()
+        batch.append((tx_id, future))
+        return await future
+
+    def _start_batch(self, height):
+        asyncio.ensure_future(self._run_batch(height, self._batches.pop(height)))
+
+    async def _run_batch(self, height, batch):
+        try:
+            levels, leaf_index = await self.levels(height)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        try:
+            proofs = getMerkleProofs([tx_id for tx_id, _ in batch], levels, leaf_index)
+        except Exception as exc:
+            # every waiting request gets an answer, whatever went wrong
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        self.stats["batches"] += 1
+        self.stats["proofs"] += len(batch)
+        root = levels[-1][0]
+        for (tx_id, future), proof in zip(batch, proofs):
+            if proof is None:
+                future.set_exception(KeyError(f"txId not in block {height}"))
+            else:
+                future.set_result({"proof": proof, "merkle_root": root})
+
+    def header(self, height):
+        self._check_height(height)
+        block = self.chain[height]
+        result = {
+            "height": height,
+            "index": block.index,
+            "hash": block.hash,
+            "prev_hash": block.prev_hash,
+            "merkle_root": block.merkle_root,
+            "timestamp": block.timestamp,
+            "difficulty": block.difficulty,
+            "nonce": block.nonce,
+        }
+        if block.header_format == "binary":
+            result["header"] = block.header_bytes().hex()  # for light_client.LightClient.add_header
+        return result
+
+    async def txids(self, height, limit=None):
+        self._check_height(height)
+        levels, _ = await self.levels(height)
+        return levels[0][:limit]
+
+    def _check_height(self, height):
+        if not isinstance(height, int) or not 0 <= height < len(self.chain):
+            raise KeyError(f"no block at height {height}")
+
+    async def handle(self, request):
+        method = request.get("method")
+        if method == "proof":
+            return await self.proof(request["height"], request["txId"])
+        if method == "header":
+            return self.header(request["height"])
+        if method == "tip":
+            return len(self.chain) - 1
+        if method == "txids":
+            return await self.txids(request["height"], request.get("limit"))
+        raise ValueError(f"unknown method: {method}")
+
+    # connections
+
+    async def _respond(self, line):
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+        except (ValueError, AttributeError):
+            return {"id": None, "error": "invalid JSON request"}
+        self.stats["requests"] += 1
+        try:
+            return {"id": request_id, "result": await self.handle(request)}
+        except Exception as exc:  # any failure is this request's error, the connection goes on
+            reason = exc.args[0] if isinstance(exc, KeyError) and exc.args else str(exc)
+            return {"id": request_id, "error": str(reason)}
+
+    async def serve_connection(self, reader, writer):
+        pending = asyncio.Queue(MAX_PIPELINE)
+
+        async def write_responses():
+            # once the client is gone the queued requests are cancelled instead of answered,
+            # the queue is still emptied so the reader never blocks on it
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                if writer.is_closing():
+                    task.cancel()
+                    continue
+                response = await task
+                if writer.is_closing():
+                    continue
+                writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                if pending.empty():
+                    try:
+                        await writer.drain()
+                    except ConnectionError:
+                        writer.close()
+
+        writer_task = asyncio.ensure_future(write_responses())
+        try:
+            async for line in reader:
+                if line.strip():
+                    await pending.put(asyncio.ensure_future(self._respond(line)))
+        except ConnectionError:
+            pass
+        finally:
+            await pending.put(None)
+            try:
+                await writer_task
+                await writer.drain()
+            except (ConnectionError, asyncio.CancelledError):
+                pass  # client gone, or the loop is shutting down
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        # -> asyncio server; port 0 picks a free port (server.sockets[0].getsockname()[1])
+        return await asyncio.start_server(self.serve_connection, host, port, limit=1 << 20)
+
+
+def _build_levels(block):
+    levels = block.merkle_tree.levels_hex()
+    return levels, build_leaf_index(levels)
+
+
+# load generator
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+async def _client_connection(host, port, targets, count, pipeline, roots, verify_every, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    sent = collections.deque()
+    window = asyncio.Semaphore(pipeline)
+
+    async def send():
+        for i in range(count):
+            await window.acquire()
+            height, tx_id = random.choice(targets)
+            sent.append((time.perf_counter(), height, tx_id))
+            writer.write(json.dumps({"id": i, "method": "proof", "height": height, "txId": tx_id}).encode() + b"\n")
+            if i % 64 == 0:
+                await writer.drain()
+        await writer.drain()
+
+    async def receive():
+        for i in range(count):
+            line = await reader.readline()
+            start, height, tx_id = sent.popleft()
+            latencies.append(time.perf_counter() - start)
+            window.release()
+            response = json.loads(line)
+            if "error" in response:
+                errors.append(response["error"])
+            elif verify_every and i % verify_every == 0:
+                if not verifyProof(tx_id, response["result"]["proof"], roots[height]):
+                    errors.append(f"invalid proof for {tx_id} in block {height}")
+
+    await asyncio.gather(send(), receive())
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_load(host, port, connections=8, requests=20_000, pipeline=32, blocks=None, txs_per_block=100,
+                   verify_every=100) -> dict:
+    # Proof requests for random txs of the last `blocks` blocks (all by default).
+    # Returns {"requests", "errors", "elapsed_sec", "requests_per_sec", "p50_ms", "p99_ms", "max_ms"}
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 24)
+
+    async def call(method, **params):
+        writer.write(json.dumps(dict(params, method=method)).encode() + b"\n")
+        return json.loads(await reader.readline())["result"]
+
+    tip = await call("tip")
+    heights = range(max(0, tip + 1 - blocks) if blocks else 0, tip + 1)
+    targets, roots = [], {}
+    for height in heights:
+        roots[height] = (await call("header", height=height))["merkle_root"]
+        targets += [(height, tx_id) for tx_id in await call("txids", height=height, limit=txs_per_block)]
+    writer.close()
+    await writer.wait_closed()
+
+    latencies, errors = [], []
+    per_connection = [requests // connections + (i < requests % connections) for i in range(connections)]
+    start = time.perf_counter()
+    await asyncio.gather(*(_client_connection(host, port, targets, count, pipeline, roots, verify_every,
+                                              latencies, errors) for count in per_connection))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_sec": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def build_demo_chain(blocks, txs_per_block):
+    from part6 import Block, create_genesis_block
+
+    chain = [create_genesis_block()]
+    for i in range(1, blocks):
+        txs = [{"from": f"user{j % 97}", "to": f"user{(i * j) % 101}", "amount": i * txs_per_block + j}
+               for j in range(txs_per_block)]
+        chain.append(Block(i, txs, chain[-1].hash))
+    return chain
+
+
+def print_load(result):
+    print(f"{result['requests']:,} requests in {result['elapsed_sec']:.2f} s "
+          f"({result['requests_per_sec']:,.0f} req/s), errors: {result['errors']}")
+    print(f"latency p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, max {result['max_ms']:.2f} ms")
+
+
+async def _serve_forever(args):
+    node = ProofNode(build_demo_chain(args.blocks, args.txs), args.cache_size)
+    server = await node.start(args.host, args.port)
+    print(f"Serving {args.blocks} blocks on {args.host}:{server.sockets[0].getsockname()[1]}")
+    async with server:
+        await server.serve_forever()
+
+
+async def _demo(args):
+    node = ProofNode(build_demo_chain(args.blocks, args.txs), args.cache_size)
+    server = await node.start(args.host, 0)
+    port = server.sockets[0].getsockname()[1]
+    print(f"Node with {args.blocks} blocks x {args.txs} txs on {args.host}:{port}")
+    async with server:
+        result = await run_load(args.host, port, args.connections, args.requests, args.pipeline)
+    print_load(result)
+    print("Node stats:", node.stats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merkle proof node and load generator")
+    parser.add_argument("mode", nargs="?", choices=("demo", "serve", "load"), default="demo",
+                        help="demo = node and load generator in one process")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--blocks", type=int, default=50)
+    parser.add_argument("--txs", type=int, default=2000, help="txs per block")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--pipeline", type=int, default=32, help="requests in flight per connection")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        asyncio.run(_serve_forever(args))
+    elif args.mode == "load":
+        print_load(asyncio.run(run_load(args.host, args.port, args.connections, args.requests, args.pipeline)))
+    else:
+        asyncio.run(_demo(args))
@@ -0,0 +1,204 @@
+﻿import abc
+import base64
+import time
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from part5 import document_to_bytes, load_public_key, pss_padding
+
+
+# Signature schemes behind one interface, chosen per document / transaction.
+#
+#   rsa-pss     RSA-2048, PSS + SHA-256 (part4/part5)
+#   ed25519     Ed25519
+#   ecdsa-p256  ECDSA on P-256 with SHA-256 (DER signature)
+#
+# Signatures travel as "<scheme>:<base64>", so the verifier knows which scheme to
+# use, and the public key must be of that scheme's type. A signature without a
+# prefix is read as rsa-pss (signatures made before schemes were named).
+# Public keys are PEM as before and parsed once via part5.load_public_key.
+# sign_raw / verify_raw work on raw signature bytes, without the prefix and base64.
+
+class SignatureScheme(abc.ABC):
+    name = None
+    private_type = None
+    public_type = None
+
+    @abc.abstractmethod
+    def generate_key(self):
+        pass
+
+    @abc.abstractmethod
+    def sign_raw(self, priv_key, data: bytes) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def verify_raw(self, pub_key, signature: bytes, data: bytes):
+        pass  # raises InvalidSignature
+
+    def sign(self, priv_key, data: bytes) -> str:
+        return f"{self.name}:{base64.b64encode(self.sign_raw(priv_key, data)).decode('ascii')}"
+
+    def verify(self, pub_key, signature: bytes, data: bytes) -> bool:
+        if not isinstance(pub_key, self.public_type):
+            return False
+        try:
+            self.verify_raw(pub_key, signature, data)
+            return True
+        except InvalidSignature:
+            return False
+
+
+class RsaPss(SignatureScheme):
+    name = "rsa-pss"
+    private_type = rsa.RSAPrivateKey
+    public_type = rsa.RSAPublicKey
+
+    def __init__(self, key_size=2048):
+        self.key_size = key_size
+
+    def generate_key(self):
+        return rsa.generate_private_key(public_exponent=65537, key_size=self.key_size)
+
+    def sign_raw(self, priv_key, data):
+        return priv_key.sign(data, pss_padding(), hashes.SHA256())
+
+    def verify_raw(self, pub_key, signature, data):
+        pub_key.verify(signature, data, pss_padding(), hashes.SHA256())
+
+
+class Ed25519(SignatureScheme):
+    name = "ed25519"
+    private_type = ed25519.Ed25519PrivateKey
+    public_type = ed25519.Ed25519PublicKey
+
+    def generate_key(self):
+        return ed25519.Ed25519PrivateKey.generate()
+
+    def sign_raw(self, priv_key, data):
+        return priv_key.sign(data)
+
+    def verify_raw(self, pub_key, signature, data):
+        pub_key.verify(signature, data)
+
+
+class EcdsaP256(SignatureScheme):
+    name = "ecdsa-p256"
+    private_type = ec.EllipticCurvePrivateKey
+    public_type = ec.EllipticCurvePublicKey
+
+    def generate_key(self):
+        return ec.generate_private_key(ec.SECP256R1())
+
+    def sign_raw(self, priv_key, data):
+        return priv_key.sign(data, ec.ECDSA(hashes.SHA256()))
+
+    def verify_raw(self, pub_key, signature, data):
+        pub_key.verify(signature, data, ec.ECDSA(hashes.SHA256()))
+
+    def verify(self, pub_key, signature, data):
+        if isinstance(pub_key, ec.EllipticCurvePublicKey) and pub_key.curve.name != "secp256r1":
+            return False
+        return super().verify(pub_key, signature, data)
+
+
+SCHEMES = {scheme.name: scheme for scheme in (RsaPss(), Ed25519(), EcdsaP256())}
+DEFAULT_SCHEME = "rsa-pss"
+
+
+def get_scheme(name) -> SignatureScheme:
+    try:
+        return SCHEMES[name]
+    except KeyError:
+        raise ValueError(f"unknown signature scheme: {name}") from None
+
+
+def scheme_for_key(priv_key) -> SignatureScheme:
+    for scheme in SCHEMES.values():
+        if isinstance(priv_key, scheme.private_type):
+            return scheme
+    raise ValueError(f"no signature scheme for {type(priv_key).__name__}")
+
+
+def generate_key(scheme=DEFAULT_SCHEME):
+    return get_scheme(scheme).generate_key()
+
+
+def parse_signature(signature: str):
+    # "<scheme>:<base64>" -> (scheme, raw signature); raises ValueError if malformed
+    name, sep, encoded = signature.rpartition(":")
+    scheme = get_scheme(name if sep else DEFAULT_SCHEME)
+    return scheme, base64.b64decode(encoded, validate=True)
+
+
+def sign(data: bytes, priv_key) -> str:
+    # the scheme follows from the key type
+    return scheme_for_key(priv_key).sign(priv_key, data)
+
+
+def verify(data: bytes, signature: str, public_key_pem: bytes) -> bool:
+    try:
+        scheme, raw = parse_signature(signature)
+        pub_key = load_public_key(public_key_pem)
+    except (ValueError, TypeError):
+        return False
+    return scheme.verify(pub_key, raw, data)
+
+
+def sign_document(doc: dict, priv_key) -> str:
+    return sign(document_to_bytes(doc), priv_key)
+
+
+def verify_document(doc: dict, signature: str, public_key_pem: bytes) -> bool:
+    return verify(document_to_bytes(doc), signature, public_key_pem)
+
+
+# speed benchmark
+
+def _rate(fn, min_time, min_ops=3):
+    # operations per second of fn(), run for at least min_time seconds
+    ops = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        ops += 1
+        elapsed = time.perf_counter() - start
+        if ops >= min_ops and elapsed >= min_time:
+            return ops / elapsed
+
+
+def benchmark_schemes(names=None, min_time=1.0, message=b"x" * 256) -> dict:
+    # -> {scheme: {"keygen_per_sec", "sign_per_sec", "verify_per_sec", "signature_size"}}
+    results = {}
+    for name in names or SCHEMES:
+        scheme = get_scheme(name)
+        priv_key = scheme.generate_key()
+        pub_key = priv_key.public_key()
+        raw = scheme.sign_raw(priv_key, message)
+        results[name] = {
+            "keygen_per_sec": _rate(scheme.generate_key, min_time),
+            "sign_per_sec": _rate(lambda: scheme.sign_raw(priv_key, message), min_time),
+            "verify_per_sec": _rate(lambda: scheme.verify(pub_key, raw, message), min_time),
+            "signature_size": len(raw),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    from tx_signing import public_key_pem
+
+    doc = {"id": "DOC-001", "content": "Blockchain lab: digital signature test"}
+    for name in SCHEMES:
+        key = generate_key(name)
+        pem = public_key_pem(key).encode("ascii")
+        signature = sign_document(doc, key)
+        tampered = dict(doc, content=doc["content"] + "!")
+        print(f"{name:<11} {signature[:40]}...  valid: {verify_document(doc, signature, pem)}, "
+              f"tampered: {verify_document(tampered, signature, pem)}")
+
+    print(f"\n{'scheme':<11} {'keygen/s':>10} {'sign/s':>10} {'verify/s':>10} {'sig bytes':>10}")
+    for name, r in benchmark_schemes(min_time=0.5).items():
+        print(f"{name:<11} {r['keygen_per_sec']:>10,.0f} {r['sign_per_sec']:>10,.0f} "
+              f"{r['verify_per_sec']:>10,.0f} {r['signature_size']:>10}")
@@ -0,0 +1,173 @@
+﻿import copy
+import hashlib
+import json
+import math
+from json.encoder import encode_basestring_ascii
+
+
+def _encode_value(value) -> str:
+    # Same text as json.dumps(value) for the simple types used in transactions
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value is None:
+        return "null"
+    if type(value) is int:
+        return int.__repr__(value)
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value, sort_keys=True)
+
+
+def _copy(value):
+    # nested values (lists, dicts) are copied in and out, so no outside reference can
+    # change them behind the cached digest
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return copy.deepcopy(value)
+
+
+class Transaction:
+    # Transaction {"from", "to", "amount", ...extra fields} with a cached txId.
+    # canonical() gives exactly json.dumps(tx_dict, sort_keys=True), so
+    # Transaction.txid == hash_tx(tx_dict) and both can be mixed in blocks.
+    # Any change (attribute or tx["key"] = value) drops the cached hash; nested extra
+    # values are stored and handed out as copies, so they cannot be changed in place.
+
+    __slots__ = ("_sender", "_recipient", "_amount", "_extra", "_digest")
+
+    def __init__(self, sender, recipient, amount, extra=None):
+        self._sender = sender
+        self._recipient = recipient
+        self._amount = amount
+        self._extra = {k: _copy(v) for k, v in extra.items()} if extra else None  # fee, signature, ...
+        self._digest = None
+
+    @classmethod
+    def from_dict(cls, tx: dict):
+        extra = {k: v for k, v in tx.items() if k not in ("from", "to", "amount")}
+        return cls(tx["from"], tx["to"], tx["amount"], extra)
+
+    @classmethod
+    def from_dicts(cls, txs) -> list:
+        # Bulk construction; plain 3-field dicts (the common case) skip the extra-field copy
+        result = []
+        new = cls.__new__
+        for tx in txs:
+            if len(tx) == 3:
+                obj = new(cls)
+                obj._sender, obj._recipient, obj._amount = tx["from"], tx["to"], tx["amount"]
+                obj._extra = None
+                obj._digest = None
+            else:
+                obj = cls.from_dict(tx)
+            result.append(obj)
+        return result
+
+    def to_dict(self) -> dict:
+        tx = {"from": self._sender, "to": self._recipient, "amount": self._amount}
+        if self._extra:
+            tx.update((k, _copy(v)) for k, v in self._extra.items())
+        return tx
+
+    # fields
+
+    @property
+    def sender(self):
+        return self._sender
+
+    @sender.setter
+    def sender(self, value):
+        self._sender = value
+        self._digest = None
+
+    @property
+    def recipient(self):
+        return self._recipient
+
+    @recipient.setter
+    def recipient(self, value):
+        self._recipient = value
+        self._digest = None
+
+    @property
+    def amount(self):
+        return self._amount
+
+    @amount.setter
+    def amount(self, value):
+        self._amount = value
+        self._digest = None
+
+    # dict-style access, so code written for tx dicts keeps working
+
+    def __getitem__(self, key):
+        if key == "from":
+            return self._sender
+        if key == "to":
+            return self._recipient
+        if key == "amount":
+            return self._amount
+        if self._extra and key in self._extra:
+            return _copy(self._extra[key])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "from":
+            self._sender = value
+        elif key == "to":
+            self._recipient = value
+        elif key == "amount":
+            self._amount = value
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = _copy(value)
+        self._digest = None
+
+    def __delitem__(self, key):
+        if not self._extra or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+        self._digest = None
+
+    def __contains__(self, key):
+        return key in ("from", "to", "amount") or bool(self._extra and key in self._extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"Transaction({self.to_dict()})"
+
+    # canonical form and hash
+
+    def canonical(self) -> str:
+        if not self._extra:
+            return (f'{{"amount": {_encode_value(self._amount)}, '
+                    f'"from": {_encode_value(self._sender)}, '
+                    f'"to": {_encode_value(self._recipient)}}}')
+        fields = {"from": self._sender, "to": self._recipient, "amount": self._amount, **self._extra}
+        return "{" + ", ".join(f"{encode_basestring_ascii(key)}: {_encode_value(fields[key])}"
+                               for key in sorted(fields)) + "}"
+
+    @property
+    def digest(self) -> bytes:
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.canonical().encode("utf-8")).digest()
+        return self._digest
+
+    @property
+    def hashed(self) -> bool:
+        # False until the digest is computed and again after any change
+        return self._digest is not None
+
+    @property
+    def txid(self) -> str:
+        return self.digest.hex()
@@ -0,0 +1,201 @@
+﻿import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.hazmat.primitives import serialization
+
+import sig_schemes
+from part5 import key_fingerprint
+from part6 import hash_tx
+from transaction import Transaction
+
+
+# Transactions signed by their sender, with any scheme of sig_schemes
+# (RSA-PSS, Ed25519, ECDSA-P256 - picked by the type of the sender's key).
+#
+# A signed tx is an ordinary tx with two more fields:
+#   "pubkey"    - sender public key, PEM text
+#   "signature" - "<scheme>:<base64>" over the canonical JSON of all other fields
+#                 (json.dumps(tx without "signature", sort_keys=True), so the key is signed too)
+# Both fields are part of the txId, like any other field.
+# The sender is bound to the key: "from" must be address(pubkey), the hex SHA-256
+# fingerprint of the PEM. Otherwise anyone could sign a tx "from" someone else
+# with their own key.
+#
+# TxVerifier checks signatures in a thread pool (OpenSSL releases the GIL) and
+# remembers successful checks in a bounded LRU keyed by (txId, signature, key
+# fingerprint), so a tx checked when it entered the mempool is not verified again
+# when its block is accepted or when the chain is validated later.
+
+SIGNATURE_CACHE_SIZE = 100_000
+
+
+def signing_bytes(tx) -> bytes:
+    fields = tx.to_dict() if isinstance(tx, Transaction) else tx
+    return json.dumps({k: v for k, v in fields.items() if k != "signature"}, sort_keys=True).encode("utf-8")
+
+
+def public_key_pem(priv_key) -> str:
+    return priv_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode("ascii")
+
+
+def address(pubkey_pem: str) -> str:
+    # sender address of a key: "from" of every tx signed with it
+    return key_fingerprint(pubkey_pem.encode("ascii")).hex()
+
+
+def sign_tx(tx, priv_key, pubkey_pem=None):
+    # Returns a signed copy (same type as tx: dict or Transaction); "from" must be
+    # address(pubkey_pem), or the tx will not verify
+    fields = dict(tx.to_dict() if isinstance(tx, Transaction) else tx)
+    fields.pop("signature", None)
+    fields["pubkey"] = pubkey_pem or public_key_pem(priv_key)
+    fields["signature"] = sig_schemes.sign(signing_bytes(fields), priv_key)
+    return Transaction.from_dict(fields) if isinstance(tx, Transaction) else fields
+
+
+def verify_tx_signature(tx) -> bool:
+    # Uncached check of one tx; a missing or malformed key/signature is just invalid,
+    # and so is a key that does not belong to the sender
+    pem, signature = tx.get("pubkey"), tx.get("signature")
+    if not isinstance(pem, str) or not isinstance(signature, str):
+        return False
+    try:
+        data = signing_bytes(tx)
+        pem = pem.encode("ascii")
+    except (ValueError, TypeError):
+        return False
+    if tx.get("from") != key_fingerprint(pem).hex():
+        return False
+    return sig_schemes.verify(data, signature, pem)
+
+
+class SignatureCache:
+    # Bounded LRU of (txId, signature, key fingerprint) that verified successfully.
+    # Failed checks are not stored.
+
+    def __init__(self, max_size=SIGNATURE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, key):
+        with self._lock:
+            self._entries[key] = True
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+def cache_key(tx):
+    # None for a tx that cannot be valid (non-ASCII key, fields that are not JSON, ...)
+    pem = tx.get("pubkey")
+    if not isinstance(pem, str):
+        return None
+    try:
+        return hash_tx(tx), tx.get("signature"), key_fingerprint(pem.encode("ascii"))
+    except (ValueError, TypeError):  # UnicodeEncodeError is a ValueError
+        return None
+
+
+class TxVerifier:
+    def __init__(self, cache=None, max_workers=None):
+        self.cache = cache if cache is not None else SignatureCache()
+        self.max_workers = max_workers
+
+    def verify_tx(self, tx) -> bool:
+        key = cache_key(tx)
+        if key is None:
+            return False
+        if key in self.cache:
+            return True
+        valid = verify_tx_signature(tx)
+        if valid:
+            self.cache.add(key)
+        return valid
+
+    def verify_txs(self, txs) -> list:
+        # one bool per tx, in order; only cache misses go to the pool
+        keys = [cache_key(tx) for tx in txs]
+        results = [key is not None and key in self.cache for key in keys]
+        todo = [i for i, key in enumerate(keys) if key is not None and not results[i]]
+        if len(todo) == 1:
+            results[todo[0]] = verify_tx_signature(txs[todo[0]])
+        elif todo:
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                for i, valid in zip(todo, pool.map(lambda i: verify_tx_signature(txs[i]), todo)):
+                    results[i] = valid
+        for i in todo:
+            if results[i]:
+                self.cache.add(keys[i])
+        return results
+
+    def check_block(self, block):
+        # None if every tx is correctly signed, otherwise the reason (as part6.check_block)
+        for i, valid in enumerate(self.verify_txs(block.transactions)):
+            if not valid:
+                return f"invalid signature in tx {i}"
+        return None
+
+
+if __name__ == "__main__":
+    import time
+
+    from mempool import Mempool
+    from part6 import Block, create_genesis_block, is_chain_valid
+
+    # one sender per scheme (+ a second RSA one)
+    keys = [sig_schemes.generate_key(name) for name in ("rsa-pss", "ed25519", "ecdsa-p256", "rsa-pss")]
+    pems = [public_key_pem(k) for k in keys]
+    addresses = [address(pem) for pem in pems]
+    txs = [sign_tx({"from": addresses[i % 4], "to": addresses[(i + 1) % 4], "amount": i, "fee": i % 10},
+                   keys[i % 4], pems[i % 4])
+           for i in range(2000)]
+
+    verifier = TxVerifier()
+    pool = Mempool(verifier=verifier)
+    start = time.time()
+    pool.add_many(txs)
+    print(f"Mempool accepted {len(pool)} signed txs in {time.time() - start:.3f} s (signatures checked)")
+
+    chain = [create_genesis_block()]
+    for _ in range(4):
+        chain.append(pool.assemble_block(500, chain[-1]))
+
+    start = time.time()
+    print("Chain valid (cached signatures):", is_chain_valid(chain, verifier=verifier),
+          f"{time.time() - start:.3f} s")
+    start = time.time()
+    print("Chain valid (cold cache):", is_chain_valid(chain, verifier=TxVerifier()),
+          f"{time.time() - start:.3f} s")
+    print(f"Cache: {len(verifier.cache)} entries, {verifier.cache.hits} hits, {verifier.cache.misses} misses")
+
+    # forged tx: amount changed after signing, block hashes fixed up
+    forged = dict(chain[2].transactions[0], amount=10_000)
+    chain[2].update_tx(0, forged)
+    for i in range(3, len(chain)):
+        chain[i] = Block(i, chain[i].transactions, chain[i - 1].hash)
+    print("Chain valid after forging a tx:", is_chain_valid(chain, verifier=verifier))
+
+    # tx "from" sender 0, signed with sender 1's key: a valid signature, but not by the sender
+    resigned = sign_tx({"from": addresses[0], "to": addresses[1], "amount": 1000}, keys[1], pems[1])
+    print("Tx re-signed with another key accepted:", verifier.verify_tx(resigned),
+          "| valid in a block:", is_chain_valid([chain[0], Block(1, [resigned], chain[0].hash)], verifier=verifier))